@@ -4,7 +4,7 @@ from logging.config import fileConfig
 from os.path import dirname, abspath
 import os
 
-from sqlalchemy import pool
+from sqlalchemy import pool, text
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
@@ -33,6 +33,15 @@ config.set_main_option("sqlalchemy.url", PG_DSN + "?async_fallback=True")
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+MIGRATION_LOCK_KEY = 7_202_581_003
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Partitions of book_reader_archive are created at runtime by app.archive.
+    if type_ == "table" and reflected and name.startswith("book_reader_archive_"):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -57,6 +66,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -64,10 +74,23 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
-
-    with context.begin_transaction():
-        context.run_migrations()
+    # Replicas starting together queue on a session-level advisory lock, so
+    # only the first applies migrations and the rest find the schema at head.
+    # It is held across the commits of autocommit_block() migrations.
+    connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    connection.commit()
+    try:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
 
 
 async def run_async_migrations() -> None:
@@ -0,0 +1,86 @@
+"""loan_surrogate_key
+
+Revision ID: 37de379e8265
+Revises: 95d5ff7fdb33
+Create Date: 2026-10-18 11:40:05.912364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '37de379e8265'
+down_revision: Union[str, Sequence[str], None] = '95d5ff7fdb33'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+BACKFILL_BATCH = sa.text("""
+    UPDATE book_reader SET id = nextval('book_reader_id_seq')
+    WHERE (book_id, reader_id) IN (
+        SELECT book_id, reader_id FROM book_reader
+        WHERE (book_id, reader_id) > (:book_id, :reader_id)
+        ORDER BY book_id, reader_id
+        LIMIT :batch_size
+    )
+    RETURNING book_id, reader_id
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The column is added without a default (no table rewrite); only new
+    # rows get ids from the sequence, existing ones are backfilled below.
+    op.execute('CREATE SEQUENCE book_reader_id_seq AS bigint')
+    op.add_column('book_reader', sa.Column('id', sa.BigInteger(), nullable=True))
+    op.execute('ALTER SEQUENCE book_reader_id_seq OWNED BY book_reader.id')
+    op.alter_column('book_reader', 'id', server_default=sa.text("nextval('book_reader_id_seq')"))
+
+    with op.get_context().autocommit_block():
+        if op.get_context().as_sql:
+            op.execute("UPDATE book_reader SET id = nextval('book_reader_id_seq') WHERE id IS NULL")
+        else:
+            # Walk the old primary key in short transactions so the table
+            # stays writable while history is rewritten.
+            connection = op.get_bind()
+            last_key = (0, 0)
+            while True:
+                rows = connection.execute(BACKFILL_BATCH, {
+                    'book_id': last_key[0],
+                    'reader_id': last_key[1],
+                    'batch_size': BATCH_SIZE,
+                }).all()
+                if not rows:
+                    break
+                last_key = max(tuple(row) for row in rows)
+
+        op.create_index('book_reader_id_key', 'book_reader', ['id'], unique=True, postgresql_concurrently=True)
+        op.create_index('ix_book_reader_reader_id', 'book_reader', ['reader_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_book_reader_open_by_reader', 'book_reader', ['reader_id'], unique=False, postgresql_where=sa.text('NOT returned'), postgresql_concurrently=True)
+        op.create_index('ix_book_reader_open_by_book', 'book_reader', ['book_id'], unique=False, postgresql_where=sa.text('NOT returned'), postgresql_concurrently=True)
+        op.create_index('uq_book_reader_open_loan', 'book_reader', ['book_id', 'reader_id'], unique=True, postgresql_where=sa.text('NOT returned'), postgresql_concurrently=True)
+
+    # A validated CHECK lets SET NOT NULL skip its own full-table scan.
+    op.execute('ALTER TABLE book_reader ADD CONSTRAINT book_reader_id_not_null CHECK (id IS NOT NULL) NOT VALID')
+    op.execute('ALTER TABLE book_reader VALIDATE CONSTRAINT book_reader_id_not_null')
+    op.alter_column('book_reader', 'id', nullable=False)
+    op.drop_constraint('book_reader_id_not_null', 'book_reader', type_='check')
+    op.drop_constraint('book_reader_pkey', 'book_reader', type_='primary')
+    op.execute('ALTER TABLE book_reader ADD CONSTRAINT book_reader_pkey PRIMARY KEY USING INDEX book_reader_id_key')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Restoring the composite key fails if a reader has borrowed the same
+    # book more than once since the upgrade.
+    op.drop_constraint('book_reader_pkey', 'book_reader', type_='primary')
+    op.create_primary_key('book_reader_pkey', 'book_reader', ['book_id', 'reader_id'])
+    op.drop_index('uq_book_reader_open_loan', table_name='book_reader', postgresql_where=sa.text('NOT returned'))
+    op.drop_index('ix_book_reader_open_by_book', table_name='book_reader', postgresql_where=sa.text('NOT returned'))
+    op.drop_index('ix_book_reader_open_by_reader', table_name='book_reader', postgresql_where=sa.text('NOT returned'))
+    op.drop_index('ix_book_reader_reader_id', table_name='book_reader')
+    op.drop_column('book_reader', 'id')
@@ -0,0 +1,32 @@
+"""reader_loan_history_index
+
+Revision ID: 3b6a1ffc7b80
+Revises: d4f81c6b2e95
+Create Date: 2026-10-18 21:12:40.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b6a1ffc7b80'
+down_revision: Union[str, Sequence[str], None] = 'd4f81c6b2e95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # book_reader stays writable while the index is built.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_book_reader_reader_borrow_date', 'book_reader', ['reader_id', 'borrow_date', 'id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_book_reader_reader_id', table_name='book_reader', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_book_reader_reader_id', 'book_reader', ['reader_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_book_reader_reader_borrow_date', table_name='book_reader', postgresql_concurrently=True)
@@ -0,0 +1,96 @@
+"""copies
+
+Revision ID: 3b9d6e1f8a27
+Revises: a7c5e2f9d413
+Create Date: 2026-10-18 19:03:27.904115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d6e1f8a27'
+down_revision: Union[str, Sequence[str], None] = 'a7c5e2f9d413'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE SEQUENCE copies_barcode_seq")
+    op.create_table('copies',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('barcode', sa.String(length=32), server_default=sa.text("'C' || lpad(nextval('copies_barcode_seq')::text, 9, '0')"), nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='available', nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('barcode')
+    )
+    op.add_column('book_reader', sa.Column('copy_id', sa.BigInteger(), nullable=True))
+    op.create_foreign_key('book_reader_copy_id_fkey', 'book_reader', 'copies', ['copy_id'], ['id'], ondelete='SET NULL')
+    op.add_column('book_reader_archive', sa.Column('copy_id', sa.BigInteger(), nullable=True))
+    op.add_column('holds', sa.Column('copy_id', sa.BigInteger(), nullable=True))
+    op.create_foreign_key('holds_copy_id_fkey', 'holds', 'copies', ['copy_id'], ['id'], ondelete='SET NULL')
+    # Shelf stock becomes available copies; every open loan and allocated
+    # hold gets a copy of its own. The ids are drawn up front so the new
+    # rows can be linked back in the same statement.
+    op.execute("""
+        INSERT INTO copies (book_id)
+        SELECT books.id FROM books CROSS JOIN generate_series(1, books.available_stock)
+    """)
+    op.execute("""
+        WITH loans AS (
+            SELECT id, book_id, nextval(pg_get_serial_sequence('copies', 'id')) AS copy_id
+            FROM book_reader
+            WHERE NOT returned
+        ), created AS (
+            INSERT INTO copies (id, book_id, status)
+            SELECT copy_id, book_id, 'on_loan' FROM loans
+        )
+        UPDATE book_reader SET copy_id = loans.copy_id
+        FROM loans
+        WHERE book_reader.id = loans.id
+    """)
+    op.execute("""
+        WITH ready AS (
+            SELECT id, book_id, nextval(pg_get_serial_sequence('copies', 'id')) AS copy_id
+            FROM holds
+            WHERE allocated_at IS NOT NULL
+        ), created AS (
+            INSERT INTO copies (id, book_id, status)
+            SELECT copy_id, book_id, 'held' FROM ready
+        )
+        UPDATE holds SET copy_id = ready.copy_id
+        FROM ready
+        WHERE holds.id = ready.id
+    """)
+    op.create_index('ix_copies_available', 'copies', ['book_id'], unique=False, postgresql_where=sa.text("status = 'available'"))
+    op.create_index('ix_copies_book_id', 'copies', ['book_id'], unique=False)
+    op.drop_column('books', 'available_stock')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('books', sa.Column('available_stock', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE books SET available_stock = stock.available
+        FROM (
+            SELECT book_id, count(*) AS available FROM copies
+            WHERE status = 'available' GROUP BY book_id
+        ) stock
+        WHERE books.id = stock.book_id
+    """)
+    op.alter_column('books', 'available_stock', server_default=None)
+    op.drop_constraint('holds_copy_id_fkey', 'holds', type_='foreignkey')
+    op.drop_column('holds', 'copy_id')
+    op.drop_column('book_reader_archive', 'copy_id')
+    op.drop_constraint('book_reader_copy_id_fkey', 'book_reader', type_='foreignkey')
+    op.drop_column('book_reader', 'copy_id')
+    op.drop_index('ix_copies_book_id', table_name='copies')
+    op.drop_index('ix_copies_available', table_name='copies', postgresql_where=sa.text("status = 'available'"))
+    op.drop_table('copies')
+    op.execute("DROP SEQUENCE copies_barcode_seq")
@@ -0,0 +1,56 @@
+"""due_dates_outbox
+
+Revision ID: 5f2d7c93a1e6
+Revises: e8b3f1a64c20
+Create Date: 2026-10-18 17:05:12.660391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2d7c93a1e6'
+down_revision: Union[str, Sequence[str], None] = 'e8b3f1a64c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('book_reader', sa.Column('due_date', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('book_reader', sa.Column('overdue_notified_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('book_reader_archive', sa.Column('due_date', sa.DateTime(timezone=True), nullable=True))
+    # Only open loans can become overdue; returned history keeps a NULL due
+    # date. 14 days is the LOAN_PERIOD_DAYS default.
+    op.execute("UPDATE book_reader SET due_date = borrow_date + interval '14 days' WHERE NOT returned")
+    op.drop_index('ix_book_reader_open_borrow_date', table_name='book_reader', postgresql_where=sa.text('NOT returned'))
+    op.create_index('ix_book_reader_open_due_date', 'book_reader', ['due_date'], unique=False, postgresql_where=sa.text('NOT returned'))
+    op.create_index('ix_book_reader_overdue_pending', 'book_reader', ['due_date'], unique=False, postgresql_where=sa.text('NOT returned AND overdue_notified_at IS NULL'))
+    op.create_table('notifications',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('reader_id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('loan_id', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['reader_id'], ['readers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notifications_pending', 'notifications', ['created_at'], unique=False, postgresql_where=sa.text('sent_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notifications_pending', table_name='notifications', postgresql_where=sa.text('sent_at IS NULL'))
+    op.drop_table('notifications')
+    op.drop_index('ix_book_reader_overdue_pending', table_name='book_reader', postgresql_where=sa.text('NOT returned AND overdue_notified_at IS NULL'))
+    op.drop_index('ix_book_reader_open_due_date', table_name='book_reader', postgresql_where=sa.text('NOT returned'))
+    op.create_index('ix_book_reader_open_borrow_date', 'book_reader', ['borrow_date'], unique=False, postgresql_where=sa.text('NOT returned'))
+    op.drop_column('book_reader_archive', 'due_date')
+    op.drop_column('book_reader', 'overdue_notified_at')
+    op.drop_column('book_reader', 'due_date')
@@ -0,0 +1,51 @@
+"""loan_archive
+
+Revision ID: 6a58c34f2972
+Revises: 37de379e8265
+Create Date: 2026-10-18 13:02:51.440871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a58c34f2972'
+down_revision: Union[str, Sequence[str], None] = '37de379e8265'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('book_reader_archive',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('reader_id', sa.Integer(), nullable=False),
+    sa.Column('borrow_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('return_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('librarian_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.ForeignKeyConstraint(['librarian_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['reader_id'], ['readers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'borrow_date'),
+    postgresql_partition_by='RANGE (borrow_date)'
+    )
+    op.create_index('ix_book_reader_archive_reader_borrow_date', 'book_reader_archive', ['reader_id', 'borrow_date'], unique=False)
+    op.execute('CREATE TABLE book_reader_archive_default PARTITION OF book_reader_archive DEFAULT')
+    op.create_index('ix_book_reader_returned_borrow_date', 'book_reader', ['borrow_date'], unique=False, postgresql_where=sa.text('returned'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Archived loans are moved back so no history is lost.
+    op.execute("""
+        INSERT INTO book_reader (id, book_id, reader_id, borrow_date, returned, return_date, librarian_id)
+        SELECT id, book_id, reader_id, borrow_date, true, return_date, librarian_id
+        FROM book_reader_archive
+    """)
+    op.drop_index('ix_book_reader_returned_borrow_date', table_name='book_reader', postgresql_where=sa.text('returned'))
+    op.drop_index('ix_book_reader_archive_reader_borrow_date', table_name='book_reader_archive')
+    op.drop_table('book_reader_archive')
@@ -0,0 +1,45 @@
+"""book_search
+
+Revision ID: 95d5ff7fdb33
+Revises: 53087487506f
+Create Date: 2026-10-18 09:12:40.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '95d5ff7fdb33'
+down_revision: Union[str, Sequence[str], None] = '53087487506f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('books', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(authors, '') "
+            "|| ' ' || coalesce(description, ''))",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], unique=False, postgresql_using='gin')
+    op.create_index('ix_books_title_trgm', 'books', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_books_authors_trgm', 'books', ['authors'], unique=False, postgresql_using='gin', postgresql_ops={'authors': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_books_authors_trgm', table_name='books', postgresql_using='gin', postgresql_ops={'authors': 'gin_trgm_ops'})
+    op.drop_index('ix_books_title_trgm', table_name='books', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.drop_index('ix_books_search_vector', table_name='books', postgresql_using='gin')
+    op.drop_column('books', 'search_vector')
@@ -0,0 +1,41 @@
+"""pending_borrows
+
+Revision ID: 9c2e4d7a1f36
+Revises: 3b6a1ffc7b80
+Create Date: 2026-10-18 21:47:05.913266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e4d7a1f36'
+down_revision: Union[str, Sequence[str], None] = '3b6a1ffc7b80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pending_borrows',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('borrow_count', sa.Integer(), server_default='1', nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Counts that were never folded are added before the table goes.
+    op.execute("""
+        INSERT INTO book_stats (book_id, borrow_count)
+        SELECT book_id, sum(borrow_count) FROM pending_borrows GROUP BY book_id
+        ON CONFLICT (book_id) DO UPDATE
+        SET borrow_count = book_stats.borrow_count + excluded.borrow_count
+    """)
+    op.drop_table('pending_borrows')
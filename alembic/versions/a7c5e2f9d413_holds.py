@@ -0,0 +1,43 @@
+"""holds
+
+Revision ID: a7c5e2f9d413
+Revises: 5f2d7c93a1e6
+Create Date: 2026-10-18 18:12:40.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c5e2f9d413'
+down_revision: Union[str, Sequence[str], None] = '5f2d7c93a1e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('holds',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('reader_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('allocated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['reader_id'], ['readers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_holds_queue', 'holds', ['book_id', 'created_at'], unique=False, postgresql_where=sa.text('allocated_at IS NULL'))
+    op.create_index('ix_holds_reader_id', 'holds', ['reader_id'], unique=False)
+    op.create_index('uq_holds_book_reader', 'holds', ['book_id', 'reader_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_holds_book_reader', table_name='holds')
+    op.drop_index('ix_holds_reader_id', table_name='holds')
+    op.drop_index('ix_holds_queue', table_name='holds', postgresql_where=sa.text('allocated_at IS NULL'))
+    op.drop_table('holds')
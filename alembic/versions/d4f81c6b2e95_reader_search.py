@@ -0,0 +1,36 @@
+"""reader_search
+
+Revision ID: d4f81c6b2e95
+Revises: 3b9d6e1f8a27
+Create Date: 2026-10-18 19:48:51.226740
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f81c6b2e95'
+down_revision: Union[str, Sequence[str], None] = '3b9d6e1f8a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('readers', sa.Column('email_normalized', sa.String(length=100), sa.Computed('lower(email)', persisted=True), nullable=True))
+    op.add_column('users', sa.Column('email_normalized', sa.String(length=100), sa.Computed('lower(email)', persisted=True), nullable=True))
+    op.create_index('ix_readers_name_trgm', 'readers', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_readers_email_normalized', 'readers', ['email_normalized'], unique=False, postgresql_ops={'email_normalized': 'text_pattern_ops'})
+    op.create_index('ix_users_email_normalized', 'users', ['email_normalized'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_email_normalized', table_name='users')
+    op.drop_index('ix_readers_email_normalized', table_name='readers', postgresql_ops={'email_normalized': 'text_pattern_ops'})
+    op.drop_index('ix_readers_name_trgm', table_name='readers', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    op.drop_column('users', 'email_normalized')
+    op.drop_column('readers', 'email_normalized')
@@ -0,0 +1,67 @@
+"""circulation_stats
+
+Revision ID: e8b3f1a64c20
+Revises: c41e9a7d2b58
+Create Date: 2026-10-18 16:22:35.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f1a64c20'
+down_revision: Union[str, Sequence[str], None] = 'c41e9a7d2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('book_stats',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('borrow_count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+    op.create_table('reader_stats',
+    sa.Column('reader_id', sa.Integer(), nullable=False),
+    sa.Column('borrow_count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('open_loans', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['reader_id'], ['readers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('reader_id')
+    )
+    # Backfill from both the hot table and the archive; runs once, so the
+    # full scan is acceptable here.
+    op.execute("""
+        INSERT INTO book_stats (book_id, borrow_count)
+        SELECT book_id, count(*) FROM (
+            SELECT book_id FROM book_reader
+            UNION ALL
+            SELECT book_id FROM book_reader_archive
+        ) loans
+        GROUP BY book_id
+    """)
+    op.execute("""
+        INSERT INTO reader_stats (reader_id, borrow_count, open_loans)
+        SELECT reader_id, count(*), count(*) FILTER (WHERE NOT returned) FROM (
+            SELECT reader_id, returned FROM book_reader
+            UNION ALL
+            SELECT reader_id, true FROM book_reader_archive
+        ) loans
+        GROUP BY reader_id
+    """)
+    op.create_index('ix_book_stats_borrow_count', 'book_stats', ['borrow_count'], unique=False)
+    op.create_index('ix_reader_stats_borrow_count', 'reader_stats', ['borrow_count'], unique=False)
+    op.create_index('ix_book_reader_open_borrow_date', 'book_reader', ['borrow_date'], unique=False, postgresql_where=sa.text('NOT returned'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_reader_open_borrow_date', table_name='book_reader', postgresql_where=sa.text('NOT returned'))
+    op.drop_index('ix_reader_stats_borrow_count', table_name='reader_stats')
+    op.drop_index('ix_book_stats_borrow_count', table_name='book_stats')
+    op.drop_table('reader_stats')
+    op.drop_table('book_stats')
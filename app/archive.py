@@ -0,0 +1,87 @@
+"""Move returned loans older than LOAN_ARCHIVE_AFTER_DAYS into book_reader_archive.
+
+Usage:
+    python -m app.archive [--older-than-days 365] [--batch-size 5000]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, insert, func, text
+
+from app.config import settings
+from app.database import Session
+from app.models import BookReader, LoanArchive
+
+
+ARCHIVE_COLUMNS = [
+    "id", "book_id", "reader_id", "copy_id", "borrow_date", "due_date", "return_date", "librarian_id"
+]
+
+
+async def ensure_partitions(session: Session, cutoff: datetime):
+    oldest = await session.scalar(
+        select(func.min(BookReader.borrow_date)).where(BookReader.returned == True)
+    )
+    if oldest is None or oldest >= cutoff:
+        return
+    for year in range(oldest.year, cutoff.year + 1):
+        await session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS book_reader_archive_{year} "
+            f"PARTITION OF book_reader_archive "
+            f"FOR VALUES FROM ('{year}-01-01 00:00+00') TO ('{year + 1}-01-01 00:00+00')"
+        ))
+    await session.commit()
+
+async def archive_batch(session: Session, cutoff: datetime, batch_size: int) -> int:
+    # SKIP LOCKED keeps the job off rows that a return is updating right now.
+    batch = (
+        select(BookReader.id)
+        .where(BookReader.returned == True)
+        .where(BookReader.borrow_date < cutoff)
+        .order_by(BookReader.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    moved = (
+        delete(BookReader)
+        .where(BookReader.id.in_(batch.scalar_subquery()))
+        .returning(*(getattr(BookReader, column) for column in ARCHIVE_COLUMNS))
+        .cte("moved")
+    )
+    query = (
+        insert(LoanArchive)
+        .from_select(ARCHIVE_COLUMNS, select(moved))
+        .returning(LoanArchive.id)
+    )
+    result = await session.execute(query)
+    count = len(result.all())
+    await session.commit()
+    return count
+
+async def archive_loans(
+        older_than: timedelta = timedelta(days=settings.LOAN_ARCHIVE_AFTER_DAYS),
+        batch_size: int = settings.LOAN_ARCHIVE_BATCH_SIZE
+) -> int:
+    cutoff = datetime.now(timezone.utc) - older_than
+    total = 0
+    async with Session() as session:
+        await ensure_partitions(session, cutoff)
+        while count := await archive_batch(session, cutoff, batch_size):
+            total += count
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive returned loans")
+    parser.add_argument(
+        "--older-than-days", type=int, default=settings.LOAN_ARCHIVE_AFTER_DAYS
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.LOAN_ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    total = asyncio.run(archive_loans(timedelta(days=args.older_than_days), args.batch_size))
+    print(f"Archived {total} loans")
+
+
+if __name__ == "__main__":
+    main()
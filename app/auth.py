@@ -1,4 +1,8 @@
+import asyncio
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
 
 import bcrypt
@@ -9,6 +13,12 @@ from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 
 from .config import settings
+from .metrics import Gauge, Histogram
+from .cache import LRUCache
+from .dependencies import SessionDep
+from .models import User
+from .schemas import GetUser
+from . import crud
 
 
 SECRET_KEY = settings.JWT_SECRET_KEY
@@ -17,17 +27,60 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def hash_password(password: str) -> str:
+# bcrypt releases the GIL, so a thread pool keeps the event loop free
+# while bounding how many hashes run at once.
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+
+HASH_PENDING = Gauge(
+    "password_hash_pending", "bcrypt jobs queued or running in the worker pool"
+)
+HASH_WAIT_SECONDS = Histogram(
+    "password_hash_wait_seconds", "Time bcrypt jobs spend queued for a worker"
+)
+HASH_SECONDS = Histogram(
+    "password_hash_seconds", "Time spent running bcrypt in a worker"
+)
+
+async def run_in_hash_pool(func, *args):
+    loop = asyncio.get_running_loop()
+    queued_at = time.perf_counter()
+
+    def job():
+        return time.perf_counter(), func(*args)
+
+    HASH_PENDING.inc()
+    try:
+        started_at, result = await loop.run_in_executor(hash_executor, job)
+    finally:
+        HASH_PENDING.dec()
+    HASH_WAIT_SECONDS.observe(started_at - queued_at)
+    HASH_SECONDS.observe(time.perf_counter() - started_at)
+    return result
+
+def _hash_password(password: str) -> str:
     password = password.encode()
-    password = bcrypt.hashpw(password, bcrypt.gensalt())
+    password = bcrypt.hashpw(password, bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS))
     password = password.decode()
     return password
 
-def check_password(password: str, hashed_password: str) -> bool:
+def _check_password(password: str, hashed_password: str) -> bool:
     password = password.encode()
     hashed_password = hashed_password.encode()
     return bcrypt.checkpw(password, hashed_password)
 
+async def hash_password(password: str) -> str:
+    return await run_in_hash_pool(_hash_password, password)
+
+async def check_password(password: str, hashed_password: str) -> bool:
+    return await run_in_hash_pool(_check_password, password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt+hash>
+    cost = int(hashed_password.split("$")[2])
+    return cost != settings.BCRYPT_ROUNDS
+
 def create_token(user_data: dict) -> str:
     payload = {
         "user": user_data,
@@ -36,7 +89,19 @@ def create_token(user_data: dict) -> str:
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+# Verified tokens are cached by hash until they expire, and resolved
+# profiles for a short TTL, so hot endpoints skip both the signature check
+# and the user lookup.
+token_cache = LRUCache("token", settings.TOKEN_CACHE_SIZE)
+principal_cache = LRUCache(
+    "principal", settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+        token_key = hashlib.sha256(token.encode()).digest()
+        user_data = token_cache.get(token_key)
+        if user_data is not None:
+            return user_data
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             user_data = payload.get("user")
@@ -45,6 +110,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Could not validate credentials",
                 )
+            token_cache.set(token_key, user_data, ttl=payload["exp"] - time.time())
             return user_data
         except jwt.ExpiredSignatureError:
             raise HTTPException(
@@ -58,3 +124,17 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             )
 
 TokenDependency = Annotated[dict, Depends(get_current_user)]
+
+async def get_current_principal(user_info: TokenDependency, session: SessionDep) -> GetUser:
+    user_id = user_info.get("id")
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = await crud.get_item(session, User, user_id)
+        principal = GetUser.model_validate(user, from_attributes=True)
+        principal_cache.set(user_id, principal)
+    return principal
+
+def invalidate_principal(user_id: int):
+    principal_cache.delete(user_id)
+
+PrincipalDependency = Annotated[GetUser, Depends(get_current_principal)]
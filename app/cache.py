@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, Hashable
+
+from .config import settings
+from .metrics import Counter
+
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result")
+
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int, ttl: float | None = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.items.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self.items[key]
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+            return default
+        self.items.move_to_end(key)
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float("inf")
+        self.items[key] = (value, expires_at)
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self.items.pop(key, None)
+
+    def clear(self):
+        self.items.clear()
+
+
+class MemoryBackend:
+    def __init__(self, cache: LRUCache):
+        self.cache = cache
+
+    async def get(self, key: str) -> bytes | None:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.cache.set(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.cache.delete(key)
+
+    async def close(self):
+        self.cache.clear()
+
+
+class RedisBackend:
+    # Works with any client exposing the redis.asyncio get/set/delete API
+    # (fakeredis included), so several workers share one cache.
+    def __init__(self, client, name: str = "detail", prefix: str = "library:"):
+        self.client = client
+        self.name = name
+        self.prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        value = await self.client.get(self.prefix + key)
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if value is None else "hit")
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_detail_cache():
+    if settings.CACHE_BACKEND == "redis":
+        from redis.asyncio import Redis  # optional dependency
+
+        return RedisBackend(Redis.from_url(settings.REDIS_URL))
+    return MemoryBackend(LRUCache("detail", settings.DETAIL_CACHE_SIZE))
+
+detail_cache = create_detail_cache()
+
+async def read_through(key: str, loader: Callable[[], Awaitable[bytes]]) -> bytes:
+    value = await detail_cache.get(key)
+    if value is None:
+        value = await loader()
+        await detail_cache.set(key, value, settings.DETAIL_CACHE_TTL_SECONDS)
+    return value
@@ -0,0 +1,256 @@
+"""Bulk import and export of the book catalog through Postgres COPY.
+
+Usage:
+    python -m app.catalog import books.csv [--format ndjson] [--on-conflict skip]
+    python -m app.catalog export books.csv
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from typing import Literal
+
+from sqlalchemy import text
+
+from app import crud
+from app.database import Session, ReadSession
+from app.schemas import MAX_STOCK
+
+
+COLUMNS = ("title", "release_year", "authors", "description", "isbn", "available_stock")
+
+ImportFormat = Literal["csv", "ndjson"]
+ConflictPolicy = Literal["update", "skip"]
+
+CREATE_STAGING = text("""
+    CREATE TEMP TABLE books_import (
+        line integer,
+        title text,
+        release_year text,
+        authors text,
+        description text,
+        isbn text,
+        available_stock text
+    ) ON COMMIT DROP
+""")
+
+# CASE, unlike AND, guarantees the pattern is checked before the cast.
+VALID_ROW = f"""
+    title IS NOT NULL AND length(title) <= 100
+    AND authors IS NOT NULL AND length(authors) <= 255
+    AND (description IS NULL OR length(description) <= 255)
+    AND isbn IS NOT NULL AND length(isbn) <= 13
+    AND release_year ~ '^-?[0-9]{{1,9}}$'
+    AND (available_stock IS NULL OR CASE
+        WHEN available_stock ~ '^[0-9]{{1,9}}$' THEN available_stock::integer <= {MAX_STOCK}
+        ELSE false
+    END)
+"""
+
+REJECTED_LINES = text(f"SELECT line FROM books_import WHERE NOT ({VALID_ROW}) ORDER BY line")
+
+DUPLICATE_LINES = text(f"""
+    SELECT line FROM (
+        SELECT line, row_number() OVER (PARTITION BY isbn ORDER BY line DESC) AS position
+        FROM books_import WHERE {VALID_ROW}
+    ) ranked
+    WHERE position > 1
+    ORDER BY line
+""")
+
+# Copies are only created for new titles: existing ones keep their copies
+# and loans, so a supplier feed only refreshes the descriptive fields.
+ON_CONFLICT = {
+    "update": """
+        ON CONFLICT (isbn) DO UPDATE SET
+            title = excluded.title,
+            release_year = excluded.release_year,
+            authors = excluded.authors,
+            description = excluded.description,
+            version = books.version + 1
+    """,
+    "skip": "ON CONFLICT (isbn) DO NOTHING",
+}
+
+UPSERT = """
+    WITH latest AS (
+        SELECT DISTINCT ON (isbn) *
+        FROM books_import
+        WHERE {valid}
+        ORDER BY isbn, line DESC
+    ), upserted AS (
+        INSERT INTO books (title, release_year, authors, description, isbn)
+        SELECT title, release_year::integer, authors, description, isbn
+        FROM latest
+        ORDER BY line
+        {on_conflict}
+        RETURNING id, isbn, xmax = 0 AS inserted
+    ), stocked AS (
+        INSERT INTO copies (book_id)
+        SELECT upserted.id
+        FROM upserted
+        JOIN latest ON latest.isbn = upserted.isbn
+        CROSS JOIN generate_series(1, coalesce(latest.available_stock::integer, 1))
+        WHERE upserted.inserted
+    )
+    SELECT latest.isbn, upserted.id, upserted.inserted
+    FROM latest LEFT JOIN upserted ON upserted.isbn = latest.isbn
+"""
+
+EXPORT = (
+    "SELECT id, title, release_year, authors, description, isbn, "
+    "(SELECT count(*) FROM copies WHERE copies.book_id = books.id "
+    "AND copies.status = 'available') AS available_stock "
+    "FROM books ORDER BY id"
+)
+
+
+def parse_value(value) -> str | None:
+    if value is None or value == "":
+        return None
+    return str(value)
+
+async def parse_records(
+        lines: AsyncIterable[str | None], import_format: ImportFormat
+) -> AsyncIterator[tuple]:
+    # Records are parsed one line at a time so the input is never held in
+    # memory; CSV values therefore must not contain line breaks. A None
+    # line could not be decoded and is rejected like any malformed row.
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if line is None:
+            record = {}
+        elif not line.strip():
+            continue
+        elif import_format == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+            if not isinstance(record, dict):
+                record = {}
+        elif header is None:
+            header = next(csv.reader([line]))
+            continue
+        else:
+            record = dict(zip(header, next(csv.reader([line]))))
+        yield (line_number, *(parse_value(record.get(column)) for column in COLUMNS))
+
+def decode_line(line: bytes) -> str | None:
+    try:
+        return line.decode().rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+async def split_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str | None]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield decode_line(line)
+    if buffer:
+        yield decode_line(buffer)
+
+async def import_books(
+        session: Session,
+        lines: AsyncIterable[str | None],
+        import_format: ImportFormat = "csv",
+        on_conflict: ConflictPolicy = "update"
+) -> dict:
+    await session.execute(CREATE_STAGING)
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    copy_result = await raw_connection.driver_connection.copy_records_to_table(
+        "books_import",
+        records=parse_records(lines, import_format),
+        columns=("line", *COLUMNS)
+    )
+    received = int(copy_result.split()[-1])
+    rejected = (await session.scalars(REJECTED_LINES)).all()
+    duplicates = (await session.scalars(DUPLICATE_LINES)).all()
+    upsert = text(UPSERT.format(valid=VALID_ROW, on_conflict=ON_CONFLICT[on_conflict]))
+    rows = (await session.execute(upsert)).all()
+    await session.commit()
+    await crud.invalidate_books(session, [row.id for row in rows if row.inserted is False])
+    return {
+        "received": received,
+        "inserted": sum(1 for row in rows if row.inserted is True),
+        "updated": sum(1 for row in rows if row.inserted is False),
+        "skipped": [row.isbn for row in rows if row.inserted is None],
+        "duplicates": duplicates,
+        "rejected": rejected,
+    }
+
+async def export_books() -> AsyncIterator[bytes]:
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=16)
+
+    async def write(data: bytes):
+        await chunks.put(bytes(data))
+
+    async def copy():
+        # Cancellation means the reader is gone, so only signal the end
+        # when the copy finished or failed on its own.
+        try:
+            async with ReadSession() as session:
+                connection = await session.connection()
+                raw_connection = await connection.get_raw_connection()
+                await raw_connection.driver_connection.copy_from_query(
+                    EXPORT, output=write, format="csv", header=True
+                )
+        except Exception:
+            await chunks.put(None)
+            raise
+        await chunks.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+        await task
+    finally:
+        task.cancel()
+
+
+async def iterate_file(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line.rstrip("\r\n")
+
+async def run_import(path: str, import_format: ImportFormat, on_conflict: ConflictPolicy):
+    with open(path, newline="") as file:
+        async with Session() as session:
+            report = await import_books(session, iterate_file(file), import_format, on_conflict)
+    print(json.dumps(report, indent=2))
+
+async def run_export(path: str):
+    output = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        async for chunk in export_books():
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of the book catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Upsert books from CSV or NDJSON")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    import_parser.add_argument("--on-conflict", choices=["update", "skip"], default="update")
+    export_parser = commands.add_parser("export", help="Write the catalog as CSV")
+    export_parser.add_argument("path", help="Output file, or - for stdout")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        asyncio.run(run_import(args.path, args.format, args.on_conflict))
+    else:
+        asyncio.run(run_export(args.path))
+
+
+if __name__ == "__main__":
+    main()
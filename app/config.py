@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,11 +8,50 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+
+    TOKEN_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+
+    CACHE_BACKEND: Literal["memory", "redis"] = "memory"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    DETAIL_CACHE_SIZE: int = 10000
+    DETAIL_CACHE_TTL_SECONDS: int = 300
+
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"
+    RATE_LIMIT_STORE_SIZE: int = 100000
+    RATE_LIMIT_IP_BURST: int = 20
+    RATE_LIMIT_IP_PER_MINUTE: float = 60
+    RATE_LIMIT_EMAIL_BURST: int = 5
+    RATE_LIMIT_EMAIL_PER_MINUTE: float = 5
+
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     POSTGRES_HOST: str
     POSTGRES_PORT: str
+    POSTGRES_REPLICA_HOST: str | None = None
+    POSTGRES_REPLICA_PORT: str | None = None
+
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MIN_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_PGBOUNCER_TRANSACTION_POOLING: bool = False
+
+    SLOW_QUERY_THRESHOLD_MS: float = 500
+
+    LOAN_PERIOD_DAYS: int = 14
+    OVERDUE_SWEEP_INTERVAL_SECONDS: float = 60
+    OVERDUE_SWEEP_BATCH_SIZE: int = 500
+    LOAN_ARCHIVE_AFTER_DAYS: int = 365
+    LOAN_ARCHIVE_BATCH_SIZE: int = 5000
 
     @property
     def pg_dsn(self) -> str:
@@ -18,6 +59,16 @@ class Settings(BaseSettings):
             f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
             f"@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
+
+    @property
+    def replica_pg_dsn(self) -> str | None:
+        if self.POSTGRES_REPLICA_HOST is None:
+            return None
+        return (
+            f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+            f"@{self.POSTGRES_REPLICA_HOST}:{self.POSTGRES_REPLICA_PORT or self.POSTGRES_PORT}"
+            f"/{self.POSTGRES_DB}"
+        )
     
     model_config = SettingsConfigDict(env_file=".env")
 
@@ -1,10 +1,30 @@
-from datetime import datetime, timezone
+import base64
+from datetime import datetime
+import re
+from collections import defaultdict
+from collections.abc import AsyncIterator, Sequence, Iterable
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import (
+    select, update, insert, delete, exists, func, literal, case, tuple_, or_, union_all
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import selectinload
+from pydantic import BaseModel
 from fastapi import HTTPException
 
-from app.database import Session
-from app.models import Reader, Book, User, BookReader, ORM_OBJECT, ORM_CLS
+from app.database import Session, ReadSession
+from app.models import (
+    Reader, Book, User, BookReader, LoanArchive, BookStats, PendingBorrow, ReaderStats, Hold,
+    Copy, ORM_OBJECT, ORM_CLS
+)
+from app.schemas import LoanOperation, GetBook, GetReader, ReadersList
+from app.cache import detail_cache, read_through
+from app import statements
+from app.statements import (
+    BORROW_LIMIT, loan_due_date, allocate_holds, fulfil_holds, schema_columns
+)
 
 
 # Base
@@ -21,8 +41,18 @@ async def add_item(session: Session, item: ORM_OBJECT) -> ORM_OBJECT:
         raise err
     return item
     
-async def get_item(session: Session, cls: ORM_CLS, item_id: int) -> ORM_OBJECT:
-    orm_obj = await session.get(cls, item_id)
+async def get_item(
+        session: Session,
+        cls: ORM_CLS,
+        item_id: int,
+        options: Sequence = (),
+        populate_existing: bool = False
+) -> ORM_OBJECT:
+    # populate_existing reloads an object already in the session, applying
+    # the loader options that a plain identity-map hit would skip.
+    orm_obj = await session.get(
+        cls, item_id, options=options, populate_existing=populate_existing
+    )
     if orm_obj is None:
         raise HTTPException(
             status_code=404,
@@ -30,85 +60,760 @@ async def get_item(session: Session, cls: ORM_CLS, item_id: int) -> ORM_OBJECT:
         )
     return orm_obj
 
-async def get_items(session: Session, cls: ORM_CLS) -> list[ORM_OBJECT]:
-    query = select(cls)
-    result = await session.execute(query)
-    items = result.unique().scalars().all()
-    return items
+async def update_item(
+        session: Session,
+        cls: ORM_CLS,
+        item_id: int,
+        values: dict,
+        versions: Sequence[int] | None = None
+) -> ORM_OBJECT:
+    # One conditional UPDATE, so the version check and the write cannot
+    # interleave with a concurrent edit; versions=None skips the check.
+    query = (
+        update(cls)
+        .where(cls.id == item_id)
+        .values(**values, version=cls.version + 1)
+        .returning(cls)
+    )
+    if versions is not None:
+        query = query.where(cls.version.in_(versions))
+    try:
+        item = (await session.execute(query)).scalar_one_or_none()
+    except IntegrityError as err:
+        if err.orig.pgcode == '23505':
+            raise HTTPException(
+                status_code=409,
+                detail='Item already exists'
+            )
+        raise err
+    if item is None:
+        await get_item(session, cls, item_id)
+        raise HTTPException(
+            status_code=412,
+            detail=f'{cls.__name__} was modified by another request'
+        )
+    await session.commit()
+    return item
+
+async def delete_item(
+        session: Session, item: ORM_OBJECT, versions: Sequence[int] | None = None
+):
+    # The mapper's version_id_col adds the version to the DELETE's WHERE,
+    # which catches edits that land between the load and the flush.
+    if versions is not None and item.version not in versions:
+        raise HTTPException(
+            status_code=412,
+            detail=f'{type(item).__name__} was modified by another request'
+        )
+    await session.delete(item)
+    try:
+        await session.commit()
+    except StaleDataError:
+        raise HTTPException(
+            status_code=412,
+            detail=f'{type(item).__name__} was modified by another request'
+        )
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode("|".join(map(str, values)).encode()).decode()
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def get_items(
+        session: Session,
+        cls: ORM_CLS,
+        schema: type[BaseModel],
+        after_id: int | None = None,
+        limit: int = 50,
+        criteria: Sequence = ()
+) -> tuple[list[Row], str | None]:
+    query = statements.items_page(cls, schema, after_id is not None)
+    if criteria:
+        query = query.where(*criteria)
+    params = {"limit": limit + 1, "after_id": after_id}
+    rows = (await session.execute(query, params)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
+
+async def stream_items(
+        cls: ORM_CLS,
+        schema: type[BaseModel],
+        after_id: int | None = None,
+        batch_size: int = 500
+) -> AsyncIterator[Row]:
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the server-side cursor gets a (read replica) session of its own.
+    query = (
+        select(*schema_columns(cls, schema))
+        .order_by(cls.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if after_id is not None:
+        query = query.where(cls.id > after_id)
+    async with ReadSession() as session:
+        result = await session.stream(query)
+        async for row in result:
+            yield row
+
+# Books
+
+ISBN_PATTERN = re.compile(r"\d{9}[\dX]|\d{13}")
+
+async def search_books(
+        session: Session, phrase: str, limit: int = 20, offset: int = 0
+) -> list[Book]:
+    isbn = phrase.replace("-", "").strip().upper()
+    if ISBN_PATTERN.fullmatch(isbn):
+        book = await session.scalar(select(Book).where(Book.isbn == isbn))
+        if book is not None:
+            return [book] if offset == 0 else []
+
+    # Every word is matched as a prefix against the full-text vector, while
+    # trigram similarity on title and authors catches typos.
+    conditions = [
+        Book.title.op("%")(phrase),
+        Book.authors.op("%")(phrase),
+    ]
+    rank = func.similarity(Book.title, phrase)
+    words = re.findall(r"\w+", phrase)
+    if words:
+        tsquery = func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+        conditions.append(Book.search_vector.op("@@")(tsquery))
+        rank = func.greatest(func.ts_rank(Book.search_vector, tsquery), rank)
+    query = (
+        select(Book)
+        .where(or_(*conditions))
+        .order_by(rank.desc(), Book.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    result = await session.scalars(query)
+    return result.all()
 
 # Users
 
 async def get_user_by_email(session: Session, cls: ORM_CLS, email: str):
-    user_query = select(cls).where(User.email == email)
-    user_model = await session.scalar(user_query)
+    params = {"email_normalized": email.strip().lower(), "email": email}
+    user_model = await session.scalar(statements.user_by_email(cls), params)
     if user_model is None:
         raise HTTPException(status_code=401, detail="User not found")
     return user_model
 
+async def rehash_password(session: Session, user_id: int, old_hash: str, new_hash: str) -> bool:
+    # Only swaps the hash the login just verified and leaves the version
+    # alone: concurrent logins race harmlessly, and a password changed in
+    # the meantime is kept.
+    result = await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .where(User.password == old_hash)
+        .values(password=new_hash)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
 # Readers
 
+async def search_readers(
+        session: Session,
+        phrase: str,
+        after_id: int | None = None,
+        limit: int = 50
+) -> tuple[list[Row], str | None]:
+    # Names match anywhere (trigram index), emails by prefix on the
+    # lower-cased column (text_pattern_ops index).
+    criteria = [or_(
+        Reader.name.icontains(phrase, autoescape=True),
+        Reader.email_normalized.startswith(phrase.strip().lower(), autoescape=True)
+    )]
+    return await get_items(session, Reader, ReadersList, after_id, limit, criteria)
+
 async def get_reader_details(
-        session: Session, reader_id: int, returned: bool = False
-):
+        session: Session,
+        reader_id: int,
+        returned: bool = False,
+        cursor: str | None = None,
+        limit: int = 50
+) -> tuple[Reader | dict, str | None]:
+    if not returned:
+        loans = Reader.books.and_(BookReader.returned == False)
+        options = [selectinload(loans).joinedload(BookReader.book)]
+        return await get_item(session, Reader, reader_id, options, populate_existing=True), None
+
+    # History spans the hot table and the archive partitions; each side is
+    # read newest-first through its (reader_id, borrow_date) index and only
+    # one page is fetched.
     reader = await get_item(session, Reader, reader_id)
-    if returned:
-        return reader
-    return {
+    hot = select(
+        BookReader.id,
+        BookReader.book_id,
+        BookReader.copy_id,
+        BookReader.borrow_date,
+        BookReader.due_date,
+        BookReader.return_date
+    ).where(BookReader.reader_id == reader_id)
+    cold = select(
+        LoanArchive.id,
+        LoanArchive.book_id,
+        LoanArchive.copy_id,
+        LoanArchive.borrow_date,
+        LoanArchive.due_date,
+        LoanArchive.return_date
+    ).where(LoanArchive.reader_id == reader_id)
+    if cursor is not None:
+        borrow_date, loan_id = decode_cursor(cursor, datetime.fromisoformat, int)
+        hot = hot.where(tuple_(BookReader.borrow_date, BookReader.id) < (borrow_date, loan_id))
+        cold = cold.where(tuple_(LoanArchive.borrow_date, LoanArchive.id) < (borrow_date, loan_id))
+    hot = hot.order_by(BookReader.borrow_date.desc(), BookReader.id.desc()).limit(limit + 1)
+    cold = cold.order_by(LoanArchive.borrow_date.desc(), LoanArchive.id.desc()).limit(limit + 1)
+    loans = union_all(hot, cold).subquery()
+    query = (
+        select(
+            loans.c.id,
+            loans.c.copy_id,
+            loans.c.borrow_date,
+            loans.c.due_date,
+            loans.c.return_date,
+            Book
+        )
+        .join(Book, Book.id == loans.c.book_id)
+        .order_by(loans.c.borrow_date.desc(), loans.c.id.desc())
+        .limit(limit + 1)
+    )
+    rows = (await session.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].borrow_date.isoformat(), rows[-1].id)
+    details = {
         "id": reader.id,
         "name": reader.name,
         "email": reader.email,
         "created_at": reader.created_at,
-        "books": reader.not_returned_books
+        "version": reader.version,
+        "books": [
+            {
+                "book": row.Book,
+                "copy_id": row.copy_id,
+                "borrow_date": row.borrow_date,
+                "due_date": row.due_date,
+                "return_date": row.return_date
+            }
+            for row in rows
+        ]
     }
-    
+    return details, next_cursor
+
+async def get_open_loans(session: Session, reader_id: int) -> list[int]:
+    query = (
+        select(BookReader.book_id)
+        .where(BookReader.reader_id == reader_id)
+        .where(BookReader.returned == False)
+    )
+    result = await session.scalars(query)
+    return result.all()
+
+async def has_loans(session: Session, book_id: int) -> bool:
+    query = select(
+        exists().where(BookReader.book_id == book_id)
+        | exists().where(LoanArchive.book_id == book_id)
+    )
+    return await session.scalar(query)
+
+# Reports
+
+async def get_popular_books(session: Session, limit: int = 10) -> list[Row]:
+    query = (
+        select(Book.id, Book.title, Book.authors, BookStats.borrow_count)
+        .join(BookStats, BookStats.book_id == Book.id)
+        .order_by(BookStats.borrow_count.desc(), BookStats.book_id)
+        .limit(limit)
+    )
+    return (await session.execute(query)).all()
+
+async def get_active_readers(session: Session, limit: int = 10) -> list[Row]:
+    query = (
+        select(
+            Reader.id, Reader.name, Reader.email, ReaderStats.borrow_count, ReaderStats.open_loans
+        )
+        .join(ReaderStats, ReaderStats.reader_id == Reader.id)
+        .order_by(ReaderStats.borrow_count.desc(), ReaderStats.reader_id)
+        .limit(limit)
+    )
+    return (await session.execute(query)).all()
+
+async def get_overdue_loans(
+        session: Session, cursor: str | None = None, limit: int = 50
+) -> tuple[list[Row], str | None]:
+    # Walks ix_book_reader_open_due_date, which only holds open loans,
+    # oldest due date first and stops at now().
+    query = (
+        select(
+            BookReader.id,
+            BookReader.book_id,
+            Book.title,
+            BookReader.reader_id,
+            Reader.name.label("reader_name"),
+            BookReader.borrow_date,
+            BookReader.due_date
+        )
+        .join(Book, Book.id == BookReader.book_id)
+        .join(Reader, Reader.id == BookReader.reader_id)
+        .where(BookReader.returned == False)
+        .where(BookReader.due_date < func.now())
+        .order_by(BookReader.due_date, BookReader.id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        due_date, loan_id = decode_cursor(cursor, datetime.fromisoformat, int)
+        query = query.where(tuple_(BookReader.due_date, BookReader.id) > (due_date, loan_id))
+    rows = (await session.execute(query)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].due_date.isoformat(), rows[-1].id)
+
+# Cached details
+
+async def get_book_details(session: Session, book_id: int) -> bytes:
+    async def load():
+        book = await get_item(session, Book, book_id, populate_existing=True)
+        return GetBook.model_validate(book, from_attributes=True).model_dump_json().encode()
+    return await read_through(f"book:{book_id}", load)
+
+async def get_cached_reader_details(session: Session, reader_id: int) -> bytes:
+    async def load():
+        reader, _ = await get_reader_details(session, reader_id)
+        return GetReader.model_validate(reader, from_attributes=True).model_dump_json().encode()
+    return await read_through(f"reader:{reader_id}", load)
+
+async def invalidate_readers(reader_ids: Iterable[int]):
+    await detail_cache.delete(*(f"reader:{reader_id}" for reader_id in reader_ids))
+
+async def invalidate_books(session: Session, book_ids: Iterable[int]):
+    # Reader details embed the books on loan, so their holders go stale too.
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    holders = await session.scalars(
+        select(BookReader.reader_id)
+        .where(BookReader.book_id.in_(book_ids))
+        .where(BookReader.returned == False)
+    )
+    await detail_cache.delete(*(f"book:{book_id}" for book_id in book_ids))
+    await invalidate_readers(holders)
+
 
 # Borrowing
 
 async def borrow_book(session: Session, book_id: int, reader_id: int, librarian_id: int):
-    book = await get_item(session, Book, book_id)
-    reader = await get_item(session, Reader, reader_id)
-    if book.available_stock <= 0:
-        raise HTTPException(status_code=400, detail="Book is not available")
-    not_returned_books = reader.not_returned_books
-    if len(not_returned_books) >= 3:
+    params = {
+        "loan_book_id": book_id, "loan_reader_id": reader_id, "loan_librarian_id": librarian_id
+    }
+    try:
+        result = (await session.execute(statements.BORROW, params)).one()
+    except IntegrityError as err:
+        # uq_book_reader_open_loan: a concurrent borrow of the same book by
+        # the same reader won the race.
+        if err.orig.pgcode == '23505':
+            raise HTTPException(status_code=400, detail="Reader already has this book")
+        raise err
+    if not result.borrowed:
+        if not result.book_exists:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if result.reader_name is None:
+            raise HTTPException(status_code=404, detail="Reader not found")
+        if result.open_count >= BORROW_LIMIT:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Reader {result.reader_name} has reached the limit of {BORROW_LIMIT} books"
+            )
+        if result.has_book:
+            raise HTTPException(status_code=400, detail="Reader already has this book")
+        if not result.available:
+            raise HTTPException(status_code=400, detail="Book is not available")
+        # A copy was free but a concurrent borrow took the reader's last slot.
         raise HTTPException(
             status_code=400,
-            detail=f"Reader {reader.name} has reached the limit of 3 books"
+            detail=f"Reader {result.reader_name} has reached the limit of {BORROW_LIMIT} books"
         )
-    for user_book in not_returned_books:
-        if user_book.book_id == book_id:
-            raise HTTPException(status_code=400, detail="Reader already has this book")
-    
-    book_reader = BookReader(
-        book_id=book_id,
-        reader_id=reader_id,
-        librarian_id=librarian_id
-    )
-    book.available_stock -= 1
-    
-    session.add(book_reader)
     await session.commit()
+    await detail_cache.delete(f"book:{book_id}")
+    await invalidate_readers({reader_id, *(result.holders or [])})
     return {"status": "ok"}
 
 async def return_book(session: Session, book_id: int, reader_id: int, librarian_id: int):
-    book = await get_item(session, Book, book_id)
-    reader = await get_item(session, Reader, reader_id)
-
-    query = (
-    select(BookReader)
-    .where(BookReader.book_id == book_id)
-    .where(BookReader.reader_id == reader_id)
-    .where(BookReader.returned == False)
-)
-    result = await session.execute(query)
-    book_reader = result.scalars().first()
-    if not book_reader:
+    params = {
+        "loan_book_id": book_id, "loan_reader_id": reader_id, "loan_librarian_id": librarian_id
+    }
+    result = (await session.execute(statements.RETURN, params)).one()
+    if not result.returned:
+        if not result.book_exists:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if not result.reader_exists:
+            raise HTTPException(status_code=404, detail="Reader not found")
         raise HTTPException(status_code=400, detail="Reader does not have this book")
-    
-    book.available_stock += 1
-    
-    book_reader.returned = True
-    book_reader.return_date = datetime.now(timezone.utc)
-    book_reader.librarian_id = librarian_id
     await session.commit()
+    await detail_cache.delete(f"book:{book_id}")
+    await invalidate_readers({reader_id, *(result.holders or [])})
     return {"status": "ok"}
+
+async def count_borrows(session: Session, books: dict[int, int]):
+    await session.execute(insert(PendingBorrow).values([
+        {"book_id": book_id, "borrow_count": count} for book_id, count in books.items()
+    ]))
+
+async def take_loan_slots(session: Session, readers: dict[int, int]) -> set[int]:
+    # As in the single borrow, the limit is re-checked under each reader's
+    # counter row lock; returns the readers whose loans all fit.
+    reader_counts = pg_insert(ReaderStats).values([
+        {"reader_id": reader_id, "borrow_count": count, "open_loans": count}
+        for reader_id, count in sorted(readers.items())
+    ])
+    counted = reader_counts.on_conflict_do_update(
+        index_elements=[ReaderStats.reader_id],
+        set_={
+            "borrow_count": ReaderStats.borrow_count + reader_counts.excluded.borrow_count,
+            "open_loans": ReaderStats.open_loans + reader_counts.excluded.open_loans
+        },
+        where=ReaderStats.open_loans + reader_counts.excluded.open_loans <= BORROW_LIMIT
+    )
+    return set(await session.scalars(counted.returning(ReaderStats.reader_id)))
+
+async def release_loan_slots(session: Session, readers: dict[int, int]):
+    for reader_id, count in sorted(readers.items()):
+        await session.execute(
+            update(ReaderStats)
+            .where(ReaderStats.reader_id == reader_id)
+            .values(
+                borrow_count=ReaderStats.borrow_count - count,
+                open_loans=ReaderStats.open_loans - count
+            )
+        )
+
+async def borrow_books(
+        session: Session, operations: list[LoanOperation], librarian_id: int
+) -> list[dict]:
+    book_ids = {operation.book_id for operation in operations}
+    reader_ids = {operation.reader_id for operation in operations}
+    books = set(await session.scalars(select(Book.id).where(Book.id.in_(book_ids))))
+    readers_query = select(Reader.id, Reader.name).where(Reader.id.in_(reader_ids))
+    readers = dict((await session.execute(readers_query)).all())
+    loans_query = (
+        select(BookReader.reader_id, BookReader.book_id)
+        .where(BookReader.reader_id.in_(reader_ids))
+        .where(BookReader.returned == False)
+    )
+    open_loans = defaultdict(set)
+    for loan_reader_id, loan_book_id in await session.execute(loans_query):
+        open_loans[loan_reader_id].add(loan_book_id)
+    ready_query = (
+        select(Hold.book_id, Hold.reader_id, Hold.copy_id)
+        .where(Hold.book_id.in_(book_ids))
+        .where(Hold.reader_id.in_(reader_ids))
+        .where(Hold.copy_id.is_not(None))
+        .order_by(Hold.id)
+        .with_for_update()
+    )
+    ready_holds = {
+        (hold_book_id, hold_reader_id): copy_id
+        for hold_book_id, hold_reader_id, copy_id in await session.execute(ready_query)
+    }
+    # At most one free copy per operation on a title is claimed up front.
+    wanted = defaultdict(int)
+    for operation in operations:
+        wanted[operation.book_id] += 1
+    free = {}
+    for book_id in sorted(books):
+        free_query = (
+            select(Copy.id)
+            .where(Copy.book_id == book_id)
+            .where(Copy.status == "available")
+            .limit(wanted[book_id])
+            .with_for_update(skip_locked=True)
+        )
+        free[book_id] = (await session.scalars(free_query)).all()
+
+    results = []
+    borrowed_by = defaultdict(int)
+    new_loans = {}
+    for operation in operations:
+        book_id, reader_id = operation.book_id, operation.reader_id
+        detail = None
+        if book_id not in books:
+            detail = "Book not found"
+        elif reader_id not in readers:
+            detail = "Reader not found"
+        elif not free[book_id] and (book_id, reader_id) not in ready_holds:
+            detail = "Book is not available"
+        elif len(open_loans[reader_id]) >= BORROW_LIMIT:
+            detail = f"Reader {readers[reader_id]} has reached the limit of {BORROW_LIMIT} books"
+        elif book_id in open_loans[reader_id]:
+            detail = "Reader already has this book"
+        else:
+            copy_id = ready_holds.pop((book_id, reader_id), None) or free[book_id].pop()
+            borrowed_by[reader_id] += 1
+            open_loans[reader_id].add(book_id)
+            new_loans[(book_id, reader_id)] = {
+                "book_id": book_id,
+                "reader_id": reader_id,
+                "copy_id": copy_id,
+                "librarian_id": librarian_id,
+                "borrow_date": func.now(),
+                "due_date": loan_due_date(),
+                "returned": False
+            }
+        results.append({
+            "book_id": book_id,
+            "reader_id": reader_id,
+            "status": "error" if detail else "ok",
+            "detail": detail
+        })
+
+    failed = {}
+    if new_loans:
+        # Concurrent borrows may have taken the slots or the same loans
+        # since the reads above; those operations fail like single borrows.
+        counted = await take_loan_slots(session, borrowed_by)
+        for pair, loan in list(new_loans.items()):
+            if loan["reader_id"] not in counted:
+                reader_name = readers[loan["reader_id"]]
+                failed[pair] = f"Reader {reader_name} has reached the limit of {BORROW_LIMIT} books"
+                del new_loans[pair]
+    if new_loans:
+        # uq_book_reader_open_loan: loans that already exist are skipped.
+        loans = (
+            pg_insert(BookReader)
+            .values(list(new_loans.values()))
+            .on_conflict_do_nothing(
+                index_elements=[BookReader.book_id, BookReader.reader_id],
+                index_where=BookReader.returned == False
+            )
+            .returning(BookReader.book_id, BookReader.reader_id)
+        )
+        inserted = {tuple(row) for row in await session.execute(loans)}
+        released = defaultdict(int)
+        for pair in set(new_loans) - inserted:
+            failed[pair] = "Reader already has this book"
+            released[pair[1]] += 1
+            del new_loans[pair]
+        if released:
+            await release_loan_slots(session, released)
+    for result in results:
+        detail = failed.get((result["book_id"], result["reader_id"]))
+        if detail and result["status"] == "ok":
+            result.update(status="error", detail=detail)
+
+    if new_loans:
+        borrowed = defaultdict(int)
+        for book_id, _ in new_loans:
+            borrowed[book_id] += 1
+        await session.execute(
+            update(Copy)
+            .where(Copy.id.in_([loan["copy_id"] for loan in new_loans.values()]))
+            .values(status="on_loan")
+        )
+        await session.execute(fulfil_holds(list(new_loans)))
+        await count_borrows(session, borrowed)
+    if borrowed_by:
+        await session.commit()
+    if new_loans:
+        await invalidate_books(session, borrowed)
+    return results
+
+async def return_books(
+        session: Session, operations: list[LoanOperation], librarian_id: int
+) -> list[dict]:
+    pairs = {(operation.book_id, operation.reader_id) for operation in operations}
+    loans_query = (
+        select(BookReader.book_id, BookReader.reader_id, BookReader.copy_id)
+        .where(tuple_(BookReader.book_id, BookReader.reader_id).in_(pairs))
+        .where(BookReader.returned == False)
+        .with_for_update()
+    )
+    open_loans = {
+        (loan_book_id, loan_reader_id): copy_id
+        for loan_book_id, loan_reader_id, copy_id in await session.execute(loans_query)
+    }
+
+    results = []
+    copies = defaultdict(list)
+    returned_by = defaultdict(int)
+    closed = []
+    for operation in operations:
+        pair = (operation.book_id, operation.reader_id)
+        detail = None
+        if pair in open_loans:
+            copy_id = open_loans.pop(pair)
+            if copy_id is not None:
+                copies[operation.book_id].append(copy_id)
+            returned_by[operation.reader_id] += 1
+            closed.append(pair)
+        else:
+            detail = "Reader does not have this book"
+        results.append({
+            "book_id": operation.book_id,
+            "reader_id": operation.reader_id,
+            "status": "error" if detail else "ok",
+            "detail": detail
+        })
+
+    if closed:
+        await session.execute(
+            update(BookReader)
+            .where(tuple_(BookReader.book_id, BookReader.reader_id).in_(closed))
+            .where(BookReader.returned == False)
+            .values(returned=True, return_date=func.now(), librarian_id=librarian_id)
+        )
+        await release_copies(session, copies)
+        await session.execute(
+            update(ReaderStats)
+            .where(ReaderStats.reader_id.in_(returned_by))
+            .values(open_loans=ReaderStats.open_loans - case(returned_by, value=ReaderStats.reader_id))
+        )
+        await session.commit()
+        await invalidate_books(session, {book_id for book_id, _ in closed})
+        await invalidate_readers(returned_by)
+    return results
+
+
+# Copies
+
+async def get_copies(session: Session, book_id: int) -> list[Copy]:
+    await get_item(session, Book, book_id)
+    copies = await session.scalars(select(Copy).where(Copy.book_id == book_id).order_by(Copy.id))
+    return copies.all()
+
+def new_copies(book_id: int, count: int):
+    return insert(Copy).from_select(
+        ["book_id"], select(literal(book_id)).select_from(func.generate_series(1, count))
+    )
+
+async def add_copies(session: Session, book_id: int, count: int):
+    # Only the copies that can go to waiting holds are fetched back; the
+    # rest are inserted straight onto the shelf.
+    waiting = await session.scalar(
+        select(func.count())
+        .where(Hold.book_id == book_id)
+        .where(Hold.allocated_at.is_(None))
+    )
+    held = min(count, waiting)
+    if held:
+        copy_ids = (await session.scalars(new_copies(book_id, held).returning(Copy.id))).all()
+        await release_copies(session, {book_id: copy_ids})
+    if count > held:
+        await session.execute(new_copies(book_id, count - held))
+
+async def set_available_copies(session: Session, book_id: int, count: int):
+    # Adds or withdraws shelf copies until `count` are available; new ones
+    # go to waiting holds first. Left uncommitted for the caller.
+    await get_item(session, Book, book_id)
+    available = (await session.scalars(
+        select(Copy.id)
+        .where(Copy.book_id == book_id)
+        .where(Copy.status == "available")
+        .order_by(Copy.id.desc())
+        .with_for_update()
+    )).all()
+    if count > len(available):
+        await add_copies(session, book_id, count - len(available))
+    elif count < len(available):
+        await session.execute(delete(Copy).where(Copy.id.in_(available[count:])))
+
+async def add_book(session: Session, book: Book, stock: int) -> Book:
+    session.add(book)
+    try:
+        await session.flush()
+        await add_copies(session, book.id, stock)
+        await session.commit()
+    except IntegrityError as err:
+        if err.orig.pgcode == '23505':
+            raise HTTPException(
+                status_code=409,
+                detail='Item already exists'
+            )
+        raise err
+    return book
+
+
+# Holds
+
+async def release_copies(session: Session, copies: dict[int, Sequence[int]]):
+    # Each copy goes to the oldest waiting hold on its title, or back on
+    # the shelf once the queue is empty.
+    held = []
+    for book_id, copy_ids in sorted(copies.items()):
+        for copy_id in copy_ids:
+            allocated, notified = allocate_holds(book_id, copy_id)
+            if await session.scalar(select(allocated.c.id).add_cte(notified)) is None:
+                break
+            held.append(copy_id)
+    copy_ids = [copy_id for book_copies in copies.values() for copy_id in book_copies]
+    if copy_ids:
+        await session.execute(
+            update(Copy)
+            .where(Copy.id.in_(copy_ids))
+            .values(status=case((Copy.id.in_(held), "held"), else_="available"))
+        )
+
+async def place_hold(session: Session, book_id: int, reader_id: int) -> Hold:
+    book = await get_item(session, Book, book_id)
+    await get_item(session, Reader, reader_id)
+    if book.available_stock > 0:
+        raise HTTPException(status_code=400, detail="Book is available")
+    if book_id in await get_open_loans(session, reader_id):
+        raise HTTPException(status_code=400, detail="Reader already has this book")
+    query = insert(Hold).values(book_id=book_id, reader_id=reader_id).returning(Hold)
+    try:
+        hold = (await session.execute(query)).scalar_one()
+    except IntegrityError as err:
+        if err.orig.pgcode == '23505':
+            raise HTTPException(status_code=400, detail="Reader already has a hold on this book")
+        raise err
+    await session.commit()
+    return hold
+
+async def get_holds(session: Session, book_id: int) -> list[Hold]:
+    await get_item(session, Book, book_id)
+    holds = await session.scalars(
+        select(Hold)
+        .where(Hold.book_id == book_id)
+        .order_by(Hold.allocated_at.is_(None), Hold.created_at, Hold.id)
+    )
+    return holds.all()
+
+async def cancel_hold(session: Session, hold_id: int):
+    query = delete(Hold).where(Hold.id == hold_id).returning(Hold.book_id, Hold.copy_id)
+    hold = (await session.execute(query)).one_or_none()
+    if hold is None:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    if hold.copy_id is not None:
+        await release_copies(session, {hold.book_id: [hold.copy_id]})
+    await session.commit()
+    if hold.copy_id is not None:
+        await invalidate_books(session, [hold.book_id])
+
+async def cancel_reader_holds(session: Session, reader_id: int) -> list[int]:
+    # Left uncommitted so it goes through together with the reader's deletion.
+    query = (
+        delete(Hold)
+        .where(Hold.reader_id == reader_id)
+        .returning(Hold.book_id, Hold.copy_id)
+    )
+    copies = defaultdict(list)
+    for book_id, copy_id in await session.execute(query):
+        if copy_id is not None:
+            copies[book_id].append(copy_id)
+    if copies:
+        await release_copies(session, copies)
+    return list(copies)
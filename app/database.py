@@ -1,13 +1,62 @@
+import time
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import (
-    async_sessionmaker, create_async_engine, AsyncAttrs, AsyncSession
+    async_sessionmaker, create_async_engine, AsyncAttrs, AsyncSession, AsyncEngine
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .config import settings
+from .metrics import Gauge, Histogram
 
 PG_DSN=settings.pg_dsn
 
-engine = create_async_engine(PG_DSN)
+POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection"
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started_at = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.observe(
+                time.perf_counter() - started_at, engine=self.logging_name
+            )
+
+
+def connect_args() -> dict:
+    if settings.DB_PGBOUNCER_TRANSACTION_POOLING:
+        # Each transaction may land on another server connection, where a
+        # statement prepared earlier does not exist: nothing is cached and
+        # every statement gets a name no other client can collide with.
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+def make_engine(dsn: str, name: str) -> AsyncEngine:
+    return create_async_engine(
+        dsn,
+        poolclass=InstrumentedPool,
+        pool_logging_name=name,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args(),
+    )
+
+engine = make_engine(PG_DSN, "primary")
 Session = async_sessionmaker(
     bind=engine, 
     expire_on_commit=False,
@@ -15,5 +64,30 @@ Session = async_sessionmaker(
     autoflush=False
 )
 
+# Read-only routes use the replica when one is configured.
+engines = {"primary": engine}
+read_engine = engine
+if settings.replica_pg_dsn is not None:
+    read_engine = engines["replica"] = make_engine(settings.replica_pg_dsn, "replica")
+ReadSession = async_sessionmaker(
+    bind=read_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    autoflush=False
+)
+
+def pool_stats(stat):
+    return lambda: [
+        ({"engine": name}, stat(pool_engine.pool)) for name, pool_engine in engines.items()
+    ]
+
+Gauge("db_pool_size", "Configured pool size", pool_stats(lambda pool: pool.size()))
+Gauge("db_pool_checked_out", "Connections in use", pool_stats(lambda pool: pool.checkedout()))
+Gauge("db_pool_idle", "Idle connections in the pool", pool_stats(lambda pool: pool.checkedin()))
+Gauge(
+    "db_pool_overflow", "Connections opened above pool_size",
+    pool_stats(lambda pool: max(pool.overflow(), 0))
+)
+
 class Base(AsyncAttrs, DeclarativeBase):
     pass
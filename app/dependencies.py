@@ -1,11 +1,30 @@
 from typing import Annotated
-from fastapi import Depends
+from fastapi import Depends, Header
 
-from .database import Session
+from .database import Session, ReadSession
 
 
 async def get_session():
     async with Session() as session:
         yield session
 
+async def get_read_session():
+    async with ReadSession() as session:
+        yield session
+
 SessionDep = Annotated[Session, Depends(get_session)]
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
+
+def get_if_match(if_match: Annotated[str | None, Header()] = None) -> list[int] | None:
+    # ETags look like "<version>-<digest>"; only the version is compared.
+    # None means no precondition, an empty list one that cannot match.
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        version, _, _ = tag.strip().strip('"').partition("-")
+        if version.isdigit():
+            versions.append(int(version))
+    return versions
+
+IfMatchDep = Annotated[list[int] | None, Depends(get_if_match)]
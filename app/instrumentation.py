@@ -0,0 +1,90 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import Gauge, Histogram
+
+
+logger = logging.getLogger("app.sql.slow")
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route"
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled"
+)
+STATEMENT_SECONDS = Histogram(
+    "db_statement_duration_seconds", "SQL statement latency by originating route"
+)
+
+# The router fills in scope["route"] on the same dict, so SQL events fired
+# while the request runs can read the matched route template from it.
+current_scope: ContextVar[Scope | None] = ContextVar("current_scope", default=None)
+
+
+def route_name(scope: Scope | None) -> str:
+    if scope is None:
+        return "-"
+    route = scope.get("route")
+    if route is None:
+        return "<unmatched>"
+    return route.path
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = current_scope.set(scope)
+        REQUESTS_IN_FLIGHT.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started_at,
+                method=scope["method"],
+                route=route_name(scope),
+                status=str(status_code)
+            )
+            current_scope.reset(token)
+
+
+# The start time lives on the statement's execution context, which is
+# dropped with it when the statement fails and after_cursor_execute never runs.
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start_time = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start_time
+    route = route_name(current_scope.get())
+    STATEMENT_SECONDS.observe(elapsed, route=route)
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold > 0 and elapsed * 1000 >= threshold:
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s", elapsed * 1000, route, " ".join(statement.split())
+        )
+
+def instrument_engine(engine: AsyncEngine):
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
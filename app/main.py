@@ -1,11 +1,78 @@
+import time
+
+# Taken before the imports below so the import phase can be reported.
+IMPORT_STARTED_AT = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 
+from app import metrics
+from app.auth import hash_executor
+from app.cache import detail_cache
+from app.config import settings
+from app.database import engine, engines
+from app.instrumentation import InstrumentationMiddleware, instrument_engine
+from app.ratelimit import RateLimitMiddleware, rate_limit_store
 from app.routers import router
+from app.warmup import report_phase, warm_up
+
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED_AT
+
+READINESS_TIMEOUT_SECONDS = 5
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # uvicorn only accepts connections once this startup half returns, so
+    # the first requests find open connections and compiled statements.
+    report_phase("import", IMPORT_SECONDS)
+    await warm_up(app)
+    sweeper = None
+    if settings.OVERDUE_SWEEP_INTERVAL_SECONDS > 0:
+        from app.sweeper import run_sweeper  # only needed when enabled
+
+        sweeper = asyncio.create_task(run_sweeper())
+    yield
+    # Runs after uvicorn has drained in-flight requests on SIGTERM.
+    if sweeper is not None:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    await detail_cache.close()
+    await rate_limit_store.close()
+    for db_engine in engines.values():
+        await db_engine.dispose()
+    hash_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(router)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+app.add_middleware(InstrumentationMiddleware)
+
+for db_engine in engines.values():
+    instrument_engine(db_engine)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
+
+@app.get("/ready", include_in_schema=False)
+async def get_readiness():
+    try:
+        async with asyncio.timeout(READINESS_TIMEOUT_SECONDS):
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+    except (OSError, SQLAlchemyError, TimeoutError):
+        return JSONResponse({"status": "unavailable"}, status_code=503)
+    return {"status": "ready"}
 
 def custom_openapi():
     if app.openapi_schema:
@@ -0,0 +1,119 @@
+from collections import defaultdict
+from collections.abc import Callable
+
+
+LabelValues = tuple[tuple[str, str], ...]
+
+REGISTRY: list["Metric"] = []
+
+
+def format_labels(labels: LabelValues) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        REGISTRY.append(self)
+
+    def samples(self) -> list[tuple[str, LabelValues, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self.values: dict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str):
+        self.values[tuple(sorted(labels.items()))] += amount
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            callback: Callable[[], list[tuple[dict[str, str], float]]] | None = None
+    ):
+        super().__init__(name, description)
+        self.values: dict[LabelValues, float] = defaultdict(float)
+        self.callback = callback
+
+    def set(self, value: float, **labels: str):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        self.values[tuple(sorted(labels.items()))] += amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.values[tuple(sorted(labels.items()))] -= amount
+
+    def samples(self):
+        if self.callback is not None:
+            return [
+                (self.name, tuple(sorted(labels.items())), value)
+                for labels, value in self.callback()
+            ]
+        return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+    )
+
+    def __init__(
+            self, name: str, description: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description)
+        self.buckets = buckets
+        self.counts: dict[LabelValues, list[int]] = {}
+        self.sums: dict[LabelValues, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        counts[-1] += 1
+        self.sums[key] += value
+
+    def samples(self):
+        samples = []
+        for labels, counts in self.counts.items():
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", labels + (("le", str(bound)),), count))
+            samples.append((f"{self.name}_bucket", labels + (("le", "+Inf"),), counts[-1]))
+            samples.append((f"{self.name}_sum", labels, self.sums[labels]))
+            samples.append((f"{self.name}_count", labels, counts[-1]))
+        return samples
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
@@ -1,38 +1,155 @@
 from datetime import datetime, timezone
 
 from sqlalchemy import (
-    Column, ForeignKey, Integer, String, Table, DateTime, Boolean
+    Column, ForeignKey, Integer, BigInteger, String, Table, DateTime, Boolean, Computed,
+    Index, PrimaryKeyConstraint, text, func, select
 )
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column, relationship, column_property
 
 from .database import Base
 
 
 class BookReader(Base):
     __tablename__ = "book_reader"
+    __table_args__ = (
+        Index("ix_book_reader_reader_borrow_date", "reader_id", "borrow_date", "id"),
+        Index("ix_book_reader_open_by_reader", "reader_id", postgresql_where=text("NOT returned")),
+        Index("ix_book_reader_open_by_book", "book_id", postgresql_where=text("NOT returned")),
+        Index(
+            "uq_book_reader_open_loan", "book_id", "reader_id",
+            unique=True, postgresql_where=text("NOT returned")
+        ),
+        Index("ix_book_reader_returned_borrow_date", "borrow_date", postgresql_where=text("returned")),
+        Index("ix_book_reader_open_due_date", "due_date", postgresql_where=text("NOT returned")),
+        Index(
+            "ix_book_reader_overdue_pending", "due_date",
+            postgresql_where=text("NOT returned AND overdue_notified_at IS NULL")
+        ),
+    )
     
-    book_id: Mapped[int] = mapped_column(ForeignKey("books.id"), primary_key=True)
-    reader_id: Mapped[int] = mapped_column(ForeignKey("readers.id"), primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id"), nullable=False)
+    reader_id: Mapped[int] = mapped_column(ForeignKey("readers.id"), nullable=False)
+    copy_id: Mapped[int] = mapped_column(
+        ForeignKey("copies.id", ondelete="SET NULL"), nullable=True
+    )
     borrow_date: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.now(timezone.utc)
     )
+    due_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     returned: Mapped[bool] = mapped_column(Boolean, default=False)
     return_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     librarian_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=True)
+    overdue_notified_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     
-    book: Mapped["Book"] = relationship("Book", back_populates="readers", lazy="selectin")
-    reader: Mapped["Reader"] = relationship("Reader", back_populates="books", lazy="selectin")
+    book: Mapped["Book"] = relationship("Book", back_populates="readers", lazy="raise")
+    reader: Mapped["Reader"] = relationship("Reader", back_populates="books", lazy="raise")
+
+class LoanArchive(Base):
+    # Cold storage for returned loans, range-partitioned by borrow_date into
+    # yearly partitions that app.archive creates as it moves rows in.
+    __tablename__ = "book_reader_archive"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "borrow_date"),
+        Index("ix_book_reader_archive_reader_borrow_date", "reader_id", "borrow_date"),
+        {"postgresql_partition_by": "RANGE (borrow_date)"},
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id"), nullable=False)
+    reader_id: Mapped[int] = mapped_column(
+        ForeignKey("readers.id", ondelete="CASCADE"), nullable=False
+    )
+    copy_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    borrow_date: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    due_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    return_date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    librarian_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=True)
+
+class Notification(Base):
+    # Outbox: rows are written in the same transaction as the state change
+    # they describe and delivered later by whatever sends mail/SMS.
+    __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_pending", "created_at", postgresql_where=text("sent_at IS NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    reader_id: Mapped[int] = mapped_column(
+        ForeignKey("readers.id", ondelete="CASCADE"), nullable=False
+    )
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    loan_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    sent_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class Hold(Base):
+    # FIFO reservation queue per book: a returned copy is set aside for the
+    # oldest waiting hold (allocated_at) instead of going back into stock.
+    __tablename__ = "holds"
+    __table_args__ = (
+        Index("ix_holds_queue", "book_id", "created_at", postgresql_where=text("allocated_at IS NULL")),
+        Index("uq_holds_book_reader", "book_id", "reader_id", unique=True),
+        Index("ix_holds_reader_id", "reader_id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    reader_id: Mapped[int] = mapped_column(
+        ForeignKey("readers.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    allocated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    copy_id: Mapped[int] = mapped_column(
+        ForeignKey("copies.id", ondelete="SET NULL"), nullable=True
+    )
+
+class Copy(Base):
+    # One row per physical copy. Borrows claim any available copy with
+    # SKIP LOCKED, so a popular title no longer funnels every loan through
+    # a single stock counter row.
+    __tablename__ = "copies"
+    __table_args__ = (
+        Index("ix_copies_book_id", "book_id"),
+        Index("ix_copies_available", "book_id", postgresql_where=text("status = 'available'")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    barcode: Mapped[str] = mapped_column(
+        String(32),
+        nullable=False,
+        unique=True,
+        server_default=text("'C' || lpad(nextval('copies_barcode_seq')::text, 9, '0')")
+    )
+    # available, on_loan, or held for an allocated hold
+    status: Mapped[str] = mapped_column(String(20), nullable=False, server_default="available")
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_email_normalized", "email_normalized"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     email: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
+    email_normalized: Mapped[str] = mapped_column(
+        String(100), Computed("lower(email)", persisted=True), deferred=True
+    )
     password: Mapped[str] = mapped_column(String(100), nullable=False)
     registered_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.now(timezone.utc)
     )
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     @property
     def dict(self):
@@ -47,29 +164,52 @@ class User(Base):
 
 class Reader(Base):
     __tablename__ = "readers"
+    __table_args__ = (
+        Index(
+            "ix_readers_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ),
+        Index(
+            "ix_readers_email_normalized", "email_normalized",
+            postgresql_ops={"email_normalized": "text_pattern_ops"}
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     email: Mapped[str] = mapped_column(String(100), nullable=False, unique=True)
+    email_normalized: Mapped[str] = mapped_column(
+        String(100), Computed("lower(email)", persisted=True), deferred=True
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.now(timezone.utc)
     )
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
     books: Mapped[list["BookReader"]] = relationship(
         "BookReader", 
         back_populates="reader", 
-        lazy="joined",
+        lazy="raise",
         cascade="all, delete-orphan"
     )
 
-    @property
-    def not_returned_books(self):
-        return [book for book in self.books if not book.returned]
-    
+    __mapper_args__ = {"version_id_col": version}
+
     def __str__(self):
         return f"{self.name} ({self.email})"
 
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        Index("ix_books_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_books_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}
+        ),
+        Index(
+            "ix_books_authors_trgm", "authors",
+            postgresql_using="gin", postgresql_ops={"authors": "gin_trgm_ops"}
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -77,13 +217,32 @@ class Book(Base):
     authors: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str] = mapped_column(String(255), nullable=True)
     isbn: Mapped[str] = mapped_column(String(13), unique=True, nullable=True)
-    available_stock: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    available_stock: Mapped[int] = column_property(
+        select(func.count(Copy.id))
+        .where(Copy.book_id == id)
+        .where(Copy.status == "available")
+        .correlate_except(Copy)
+        .scalar_subquery()
+        .label("available_stock")
+    )
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(authors, '') "
+            "|| ' ' || coalesce(description, ''))",
+            persisted=True
+        ),
+        deferred=True
+    )
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
     readers: Mapped[list["BookReader"]] = relationship(
         "BookReader", 
         back_populates="book",
-        lazy="selectin"
+        lazy="raise"
     )
 
+    __mapper_args__ = {"version_id_col": version}
+
     @property
     def dict(self):
         return {
@@ -98,5 +257,40 @@ class Book(Base):
     def __str__(self):
         return f"{self.title} ({self.release_year})"
 
+class BookStats(Base):
+    # Circulation counters, so reports read one row per book instead of
+    # the loan history. Borrows reach them through PendingBorrow.
+    __tablename__ = "book_stats"
+    __table_args__ = (
+        Index("ix_book_stats_borrow_count", "borrow_count"),
+    )
+
+    book_id: Mapped[int] = mapped_column(
+        ForeignKey("books.id", ondelete="CASCADE"), primary_key=True
+    )
+    borrow_count: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+
+class PendingBorrow(Base):
+    # Borrows not yet added to book_stats. Appending a row instead of
+    # bumping the counter keeps concurrent borrows of one title from
+    # queueing on its book_stats row; the sweeper folds them in batches.
+    __tablename__ = "pending_borrows"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    book_id: Mapped[int] = mapped_column(ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    borrow_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+class ReaderStats(Base):
+    __tablename__ = "reader_stats"
+    __table_args__ = (
+        Index("ix_reader_stats_borrow_count", "borrow_count"),
+    )
+
+    reader_id: Mapped[int] = mapped_column(
+        ForeignKey("readers.id", ondelete="CASCADE"), primary_key=True
+    )
+    borrow_count: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    open_loans: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
 ORM_OBJECT = Reader | Book | User
 ORM_CLS = type[Reader] | type[Book] | type[User]
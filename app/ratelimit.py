@@ -0,0 +1,167 @@
+import json
+import math
+import time
+from collections import OrderedDict
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import Counter
+
+
+RATE_LIMITED = Counter("rate_limited_requests_total", "Requests rejected by bucket")
+
+LIMITED_PATHS = frozenset({"/api/v1/login", "/api/v1/register"})
+
+# Credentials are tiny; anything larger is passed on unparsed and only
+# the per-IP bucket applies to it.
+MAX_BODY_BYTES = 16 * 1024
+
+
+class MemoryStore:
+    # Least recently used buckets are dropped first; a dropped bucket
+    # simply starts full again.
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.maxsize:
+            self.buckets.popitem(last=False)
+        return retry_after
+
+    async def close(self):
+        self.buckets.clear()
+
+
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisStore:
+    # The bucket is read and updated in one script on the Redis clock,
+    # so every worker draws from the same tokens.
+    def __init__(self, client, prefix: str = "library:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        retry_after = await self.script(keys=[self.prefix + key], args=[capacity, rate])
+        return float(retry_after)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_store():
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        from redis.asyncio import Redis  # optional dependency
+
+        return RedisStore(Redis.from_url(settings.REDIS_URL))
+    return MemoryStore(settings.RATE_LIMIT_STORE_SIZE)
+
+rate_limit_store = create_store()
+
+async def read_email(receive: Receive) -> tuple[str | None, list[Message]]:
+    messages = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return None, messages
+        size += len(message.get("body", b""))
+        if size > MAX_BODY_BYTES:
+            return None, messages
+        if not message.get("more_body", False):
+            break
+    try:
+        payload = json.loads(b"".join(chunk.get("body", b"") for chunk in messages))
+    except ValueError:
+        return None, messages
+    email = payload.get("email") if isinstance(payload, dict) else None
+    if not isinstance(email, str):
+        return None, messages
+    return email.strip().lower(), messages
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, store=None):
+        self.app = app
+        self.store = store if store is not None else rate_limit_store
+
+    async def reject(self, scope: Scope, receive: Receive, send: Send, bucket: str, retry_after: float):
+        RATE_LIMITED.inc(bucket=bucket)
+        response = JSONResponse(
+            {"detail": "Too many requests"},
+            status_code=429,
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in LIMITED_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        address = client[0] if client else "unknown"
+        retry_after = await self.store.take(
+            f"ip:{address}",
+            settings.RATE_LIMIT_IP_BURST,
+            settings.RATE_LIMIT_IP_PER_MINUTE / 60
+        )
+        if retry_after:
+            await self.reject(scope, receive, send, "ip", retry_after)
+            return
+
+        email, messages = await read_email(receive)
+        if email is not None:
+            retry_after = await self.store.take(
+                f"email:{email}",
+                settings.RATE_LIMIT_EMAIL_BURST,
+                settings.RATE_LIMIT_EMAIL_PER_MINUTE / 60
+            )
+            if retry_after:
+                await self.reject(scope, receive, send, "email", retry_after)
+                return
+
+        async def replay() -> Message:
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        await self.app(scope, replay, send)
@@ -1,10 +1,19 @@
-from fastapi import APIRouter, HTTPException
+import hashlib
+import json
+from functools import cache
 
-from app.dependencies import SessionDep
+from fastapi import APIRouter, HTTPException, Query, Request, Response, Body
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict
+
+from app.dependencies import SessionDep, ReadSessionDep, IfMatchDep
 from app.models import User, Reader, Book
 from app.schemas import (
     ItemId,
     StatusResponse,
+    LoanOperation,
+    LoanResult,
     BaseUser,
     CreateUser,
     GetUser,
@@ -15,11 +24,25 @@ from app.schemas import (
     UpdateReader,
     BaseBook,
     GetBook,
-    UpdateBook
-
+    UpdateBook,
+    ImportReport,
+    BookCirculation,
+    ReaderCirculation,
+    OverdueLoan,
+    GetHold,
+    GetCopy
+)
+from app.auth import (
+    TokenDependency,
+    PrincipalDependency,
+    hash_password,
+    check_password,
+    needs_rehash,
+    create_token,
+    invalidate_principal
 )
-from app.auth import TokenDependency, hash_password, check_password, create_token
 import app.crud as crud
+import app.catalog as catalog
 
 
 router = APIRouter(
@@ -31,49 +54,135 @@ router = APIRouter(
 @router.post("/register", response_model=ItemId, tags=["auth"])
 async def register_user(user_data: CreateUser, session: SessionDep):
     user = User(**user_data.model_dump())
-    user.password = hash_password(user.password)
+    user.password = await hash_password(user.password)
     user_db = await crud.add_item(session, user)
     return {"id": user_db.id}
 
 @router.post("/login", response_model=str, tags=["auth"])
 async def login_user(user_data: BaseUser, session: SessionDep):
     user_db = await crud.get_user_by_email(session, User, user_data.email)
-    if not check_password(user_data.password, user_db.password):
+    if not await check_password(user_data.password, user_db.password):
         raise HTTPException(status_code=401, detail="Incorrect password")
+    if needs_rehash(user_db.password):
+        new_hash = await hash_password(user_data.password)
+        if await crud.rehash_password(session, user_db.id, user_db.password, new_hash):
+            invalidate_principal(user_db.id)
     user_data = {"id": user_db.id}
     return create_token(user_data)
 
 @router.get("/my_profile", response_model=GetUser, tags=["auth"])
-async def get_user(user_info: TokenDependency, session: SessionDep):
-    user_id = user_info.get("id")
-    user = await crud.get_item(session, User, user_id)
-    return user
+async def get_user(user: PrincipalDependency, request: Request):
+    return etag_response(request, user.model_dump_json().encode())
 
 @router.patch("/my_profile", response_model=GetUser, tags=["auth"])
-async def update_user(user_info: TokenDependency, user_data: UpdateUser, session: SessionDep):
+async def update_user(
+    user_info: TokenDependency,
+    user_data: UpdateUser,
+    session: SessionDep,
+    versions: IfMatchDep
+):
     user_id = user_info.get("id")
-    user = await crud.get_item(session, User, user_id)
-    for field, value in user_data.model_dump(exclude_unset=True).items():
-        if field == "password":
-            value = hash_password(value)
-        setattr(user, field, value)
-    user = await crud.add_item(session, user)
-    return user
+    values = user_data.model_dump(exclude_unset=True)
+    if "password" in values:
+        values["password"] = await hash_password(values["password"])
+    user = await crud.update_item(session, User, user_id, values, versions)
+    invalidate_principal(user_id)
+    return json_response(GetUser.model_validate(user, from_attributes=True).model_dump_json().encode())
 
 # Readers
 
+@cache
+def rows_adapter(schema: type[BaseModel]) -> TypeAdapter:
+    # A TypedDict mirror of the schema validates and encodes rows in
+    # pydantic-core without building a model instance per row.
+    fields = {name: field.annotation for name, field in schema.model_fields.items()}
+    return TypeAdapter(list[TypedDict(f"{schema.__name__}Row", fields)])
+
+def json_list_response(schema, rows, next_cursor: str | None) -> Response:
+    adapter = rows_adapter(schema)
+    fields = tuple(schema.model_fields)
+    body = adapter.dump_json(adapter.validate_python([dict(zip(fields, row)) for row in rows]))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return Response(body, media_type="application/json", headers=headers)
+
+def ndjson_response(cls, schema, after_id: int | None) -> StreamingResponse:
+    async def lines():
+        async for row in crud.stream_items(cls, schema, after_id):
+            yield schema.model_validate(row._asdict()).model_dump_json() + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def entity_tag(body: bytes) -> str:
+    # The version drives If-Match; the digest also changes when a reader's
+    # embedded loans do, which keeps If-None-Match honest.
+    version = json.loads(body)["version"]
+    return f'"{version}-{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def json_response(body: bytes) -> Response:
+    return Response(body, media_type="application/json", headers={"ETag": entity_tag(body)})
+
+def etag_response(request: Request, body: bytes) -> Response:
+    # Cached bodies are already serialized, so a matching If-None-Match is
+    # answered without touching Pydantic at all.
+    response = json_response(body)
+    etag = response.headers["ETag"]
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    return response
+
+def resolve_after_id(after_id: int | None, cursor: str | None) -> int | None:
+    if cursor is not None:
+        after_id, = crud.decode_cursor(cursor, int)
+    return after_id
+
 @router.get("/readers", response_model=list[ReadersList], tags=["readers"])
-async def get_readers(session: SessionDep, jwt_required: TokenDependency):
-    return await crud.get_items(session, Reader)
+async def get_readers(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    after_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    stream: bool = False
+):
+    after_id = resolve_after_id(after_id, cursor)
+    if stream:
+        return ndjson_response(Reader, ReadersList, after_id)
+    readers, next_cursor = await crud.get_items(session, Reader, ReadersList, after_id, limit)
+    return json_list_response(ReadersList, readers, next_cursor)
+
+@router.get("/readers/search", response_model=list[ReadersList], tags=["readers"])
+async def search_readers(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    q: str = Query(min_length=1, max_length=100),
+    after_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500)
+):
+    after_id = resolve_after_id(after_id, cursor)
+    readers, next_cursor = await crud.search_readers(session, q, after_id, limit)
+    return json_list_response(ReadersList, readers, next_cursor)
 
 @router.get("/readers/{reader_id}", response_model=GetReader, tags=["readers"])
 async def get_reader(
     reader_id: int,
     session: SessionDep, 
     jwt_required: TokenDependency,
-    with_history: bool = False
+    request: Request,
+    response: Response,
+    with_history: bool = False,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500)
 ):
-    return await crud.get_reader_details(session, reader_id, with_history)
+    if not with_history:
+        body = await crud.get_cached_reader_details(session, reader_id)
+        return etag_response(request, body)
+    reader, next_cursor = await crud.get_reader_details(
+        session, reader_id, with_history, cursor, limit
+    )
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return reader
 
 
 @router.post("/readers", response_model=ItemId, tags=["readers"])
@@ -87,37 +196,94 @@ async def update_reader(
     reader_id: int, 
     reader_data: UpdateReader, 
     session: SessionDep, 
-    jwt_required: TokenDependency
+    jwt_required: TokenDependency,
+    versions: IfMatchDep
 ):
-    reader = await crud.get_item(session, Reader, reader_id)
-    for field, value in reader_data.model_dump(exclude_unset=True).items():
-        setattr(reader, field, value)
-    reader = await crud.add_item(session, reader)
-    return reader
+    values = reader_data.model_dump(exclude_unset=True)
+    await crud.update_item(session, Reader, reader_id, values, versions)
+    await crud.invalidate_readers([reader_id])
+    return json_response(await crud.get_cached_reader_details(session, reader_id))
 
 @router.delete("/readers/{reader_id}", response_model=StatusResponse, tags=["readers"])
-async def delete_reader(reader_id: int, session: SessionDep, jwt_required: TokenDependency):
+async def delete_reader(
+    reader_id: int,
+    session: SessionDep,
+    jwt_required: TokenDependency,
+    versions: IfMatchDep
+):
     reader = await crud.get_item(session, Reader, reader_id)
-    if reader.not_returned_books:
+    if await crud.get_open_loans(session, reader_id):
         raise HTTPException(status_code=400, detail="Cannot delete reader with books")
     
-    await session.delete(reader)
-    await session.commit()
+    released = await crud.cancel_reader_holds(session, reader_id)
+    await crud.delete_item(session, reader, versions)
+    await crud.invalidate_readers([reader_id])
+    await crud.invalidate_books(session, released)
     return {"status": "deleted"}
 
 # Books
 
 @router.get("/books", response_model=list[GetBook], tags=["books"])
-async def get_books(session: SessionDep, jwt_required: TokenDependency):
-    return await crud.get_items(session, Book)
+async def get_books(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    after_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    stream: bool = False
+):
+    after_id = resolve_after_id(after_id, cursor)
+    if stream:
+        return ndjson_response(Book, GetBook, after_id)
+    books, next_cursor = await crud.get_items(session, Book, GetBook, after_id, limit)
+    return json_list_response(GetBook, books, next_cursor)
+
+@router.get("/books/search", response_model=list[GetBook], tags=["books"])
+async def search_books(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0)
+):
+    return await crud.search_books(session, q, limit, offset)
+
+@router.post("/books/import", response_model=ImportReport, tags=["books"])
+async def import_books(
+    request: Request,
+    session: SessionDep,
+    jwt_required: TokenDependency,
+    format: catalog.ImportFormat = "csv",
+    on_conflict: catalog.ConflictPolicy = "update"
+):
+    lines = catalog.split_lines(request.stream())
+    return await catalog.import_books(session, lines, format, on_conflict)
+
+@router.get("/books/export", tags=["books"])
+async def export_books(jwt_required: TokenDependency):
+    return StreamingResponse(
+        catalog.export_books(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=books.csv"}
+    )
 
 @router.get("/books/{book_id}", response_model=GetBook, tags=["books"])
 async def get_book(
     book_id: int, 
-    session: SessionDep, 
+    session: ReadSessionDep, 
+    jwt_required: TokenDependency,
+    request: Request
+):
+    body = await crud.get_book_details(session, book_id)
+    return etag_response(request, body)
+
+@router.get("/books/{book_id}/copies", response_model=list[GetCopy], tags=["books"])
+async def get_copies(
+    book_id: int,
+    session: ReadSessionDep,
     jwt_required: TokenDependency
 ):
-    return await crud.get_item(session, Book, book_id)
+    return await crud.get_copies(session, book_id)
 
 @router.post("/books", response_model=ItemId, tags=["books"])
 async def add_book(
@@ -125,8 +291,9 @@ async def add_book(
     session: SessionDep, 
     jwt_required: TokenDependency
 ):
-    book = Book(**book_data.model_dump())
-    book_db = await crud.add_item(session, book)
+    values = book_data.model_dump()
+    stock = values.pop("available_stock")
+    book_db = await crud.add_book(session, Book(**values), stock)
     return {"id": book_db.id}
 
 @router.patch("/books/{book_id}", response_model=GetBook, tags=["books"])
@@ -134,28 +301,31 @@ async def update_book(
     book_id: int, 
     book_data: UpdateBook, 
     session: SessionDep, 
-    jwt_required: TokenDependency
+    jwt_required: TokenDependency,
+    versions: IfMatchDep
 ):
-    book = await crud.get_item(session, Book, book_id)
-    for field, value in book_data.model_dump(exclude_unset=True).items():
-        setattr(book, field, value)
-    book = await crud.add_item(session, book)
-    return book
+    values = book_data.model_dump(exclude_unset=True)
+    stock = values.pop("available_stock", None)
+    if stock is not None:
+        await crud.set_available_copies(session, book_id, stock)
+    await crud.update_item(session, Book, book_id, values, versions)
+    await crud.invalidate_books(session, [book_id])
+    return json_response(await crud.get_book_details(session, book_id))
 
 @router.delete("/books/{book_id}", response_model=StatusResponse, tags=["books"])
 async def delete_book(
     book_id: int, 
     session: SessionDep, 
-    jwt_required: TokenDependency
+    jwt_required: TokenDependency,
+    versions: IfMatchDep
 ):
     book = await crud.get_item(session, Book, book_id)
-    try:
-        await session.delete(book)
-        await session.commit()
-    except AssertionError as err:
+    if await crud.has_loans(session, book_id):
         raise HTTPException(
             status_code=400, detail=str("You cannot delete book with borrowed copies")
         )
+    await crud.delete_item(session, book, versions)
+    await crud.invalidate_books(session, [book_id])
     return {"status": "deleted"}
 
 # Borrowing
@@ -177,3 +347,77 @@ async def return_book(
     user: TokenDependency
 ):
     return await crud.return_book(session, book_id, reader_id, user.get("id"))
+
+@router.post("/borrow/batch", response_model=list[LoanResult], tags=["borrowing"])
+async def borrow_books(
+    session: SessionDep,
+    user: TokenDependency,
+    operations: list[LoanOperation] = Body(min_length=1, max_length=100)
+):
+    return await crud.borrow_books(session, operations, user.get("id"))
+
+@router.post("/return/batch", response_model=list[LoanResult], tags=["borrowing"])
+async def return_books(
+    session: SessionDep,
+    user: TokenDependency,
+    operations: list[LoanOperation] = Body(min_length=1, max_length=100)
+):
+    return await crud.return_books(session, operations, user.get("id"))
+
+# Holds
+
+@router.post("/holds", response_model=GetHold, tags=["holds"])
+async def place_hold(
+    book_id: int,
+    reader_id: int,
+    session: SessionDep,
+    jwt_required: TokenDependency
+):
+    return await crud.place_hold(session, book_id, reader_id)
+
+@router.get("/books/{book_id}/holds", response_model=list[GetHold], tags=["holds"])
+async def get_holds(
+    book_id: int,
+    session: ReadSessionDep,
+    jwt_required: TokenDependency
+):
+    return await crud.get_holds(session, book_id)
+
+@router.delete("/holds/{hold_id}", response_model=StatusResponse, tags=["holds"])
+async def cancel_hold(
+    hold_id: int,
+    session: SessionDep,
+    jwt_required: TokenDependency
+):
+    await crud.cancel_hold(session, hold_id)
+    return {"status": "deleted"}
+
+# Reports
+
+@router.get("/reports/popular-books", response_model=list[BookCirculation], tags=["reports"])
+async def get_popular_books(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    limit: int = Query(default=10, ge=1, le=100)
+):
+    books = await crud.get_popular_books(session, limit)
+    return json_list_response(BookCirculation, books, None)
+
+@router.get("/reports/active-readers", response_model=list[ReaderCirculation], tags=["reports"])
+async def get_active_readers(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    limit: int = Query(default=10, ge=1, le=100)
+):
+    readers = await crud.get_active_readers(session, limit)
+    return json_list_response(ReaderCirculation, readers, None)
+
+@router.get("/reports/overdue", response_model=list[OverdueLoan], tags=["reports"])
+async def get_overdue_loans(
+    session: ReadSessionDep,
+    jwt_required: TokenDependency,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500)
+):
+    loans, next_cursor = await crud.get_overdue_loans(session, cursor, limit)
+    return json_list_response(OverdueLoan, loans, next_cursor)
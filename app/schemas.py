@@ -4,12 +4,24 @@ from typing import Literal
 from pydantic import BaseModel, EmailStr, field_validator, Field
 
 
+# Each unit of stock is a row in copies, so one request can only add so many.
+MAX_STOCK = 1000
+
+
 class ItemId(BaseModel):
     id: int
 
 class StatusResponse(BaseModel):
     status: Literal["ok", "deleted"]
 
+class LoanOperation(BaseModel):
+    book_id: int
+    reader_id: int
+
+class LoanResult(LoanOperation):
+    status: Literal["ok", "error"]
+    detail: str | None = None
+
 class BaseUser(BaseModel):
     email: EmailStr
     password: str
@@ -34,6 +46,7 @@ class GetUser(BaseModel):
     name: str
     email: EmailStr
     registered_at: datetime
+    version: int
 
 class UpdateUser(BaseModel):
     name: str | None = None
@@ -57,21 +70,32 @@ class BaseBook(BaseModel):
     release_year: int
     authors: str
     isbn: str
-    available_stock: int
+    available_stock: int = Field(ge=0, le=MAX_STOCK)
 
 class GetBook(BaseBook):
     id: int
+    version: int
 
 class UpdateBook(BaseModel):
     title: str | None = None
     release_year: int | None = None
     authors: str | None = None
     isbn: str | None = None
-    available_stock: int | None = None
+    available_stock: int | None = Field(default=None, ge=0, le=MAX_STOCK)
+
+class ImportReport(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    skipped: list[str]
+    duplicates: list[int]
+    rejected: list[int]
 
 class BorrowedBookInfo(BaseModel):
     book: GetBook
+    copy_id: int | None = None
     borrow_date: datetime
+    due_date: datetime | None = None
     return_date: datetime | None = None
 
 class BaseReader(BaseModel):
@@ -80,12 +104,48 @@ class BaseReader(BaseModel):
 
 class ReadersList(BaseReader):
     id: int
+    version: int
 
 class GetReader(BaseReader):
     id: int
     created_at: datetime
+    version: int
     books: list[BorrowedBookInfo]
 
 class UpdateReader(BaseModel):
     name: str | None = None
     email: EmailStr | None = None
+
+class BookCirculation(BaseModel):
+    id: int
+    title: str
+    authors: str
+    borrow_count: int
+
+class ReaderCirculation(BaseModel):
+    id: int
+    name: str
+    email: EmailStr
+    borrow_count: int
+    open_loans: int
+
+class OverdueLoan(BaseModel):
+    id: int
+    book_id: int
+    title: str
+    reader_id: int
+    reader_name: str
+    borrow_date: datetime
+    due_date: datetime
+
+class GetHold(BaseModel):
+    id: int
+    book_id: int
+    reader_id: int
+    created_at: datetime
+    allocated_at: datetime | None = None
+
+class GetCopy(BaseModel):
+    id: int
+    barcode: str
+    status: Literal["available", "on_loan", "held"]
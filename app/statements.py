@@ -0,0 +1,267 @@
+"""Statements for the hot crud paths, built once with named parameters.
+
+A pre-built construct memoizes its cache key, so each call skips building
+the expression tree and walking it again; SQLAlchemy finds the compiled
+SQL by that key and the driver reuses the prepared statement by its text.
+"""
+from datetime import timedelta
+from collections.abc import Sequence
+from functools import cache
+
+from sqlalchemy import (
+    Integer, bindparam, select, update, insert, delete, exists, func, literal, false, case,
+    tuple_, or_
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from pydantic import BaseModel
+
+from app.config import settings
+from app.models import (
+    Reader, Book, BookReader, PendingBorrow, ReaderStats, Hold, Copy, Notification, ORM_CLS
+)
+
+
+BORROW_LIMIT = 3
+
+def loan_due_date():
+    return func.now() + timedelta(days=settings.LOAN_PERIOD_DAYS)
+
+def open_loan_holders(book_id):
+    # Evaluated in the same statement so cache invalidation costs no extra
+    # round trip; it sees the loans as they were before the statement ran.
+    return (
+        select(func.array_agg(BookReader.reader_id))
+        .where(BookReader.book_id == book_id)
+        .where(BookReader.returned == False)
+        .scalar_subquery()
+        .label("holders")
+    )
+
+def allocate_holds(book_id, copy_id, condition=None):
+    # Sets `copy_id` aside for the oldest waiting hold on the book. SKIP
+    # LOCKED makes concurrent returns of one title pick different holds, so
+    # no hold gets two copies. Readers who got the book some other way
+    # meanwhile are passed over.
+    head = (
+        select(Hold.id)
+        .where(Hold.book_id == book_id)
+        .where(Hold.allocated_at.is_(None))
+        .where(~exists(
+            select(BookReader.id)
+            .where(BookReader.book_id == Hold.book_id)
+            .where(BookReader.reader_id == Hold.reader_id)
+            .where(BookReader.returned == False)
+        ))
+        .order_by(Hold.created_at, Hold.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if condition is not None:
+        head = head.where(condition)
+    allocated = (
+        update(Hold)
+        .where(Hold.id.in_(head))
+        .values(allocated_at=func.now(), copy_id=copy_id)
+        .returning(Hold.id, Hold.book_id, Hold.reader_id)
+        .cte("allocated")
+    )
+    notified = (
+        insert(Notification)
+        .from_select(
+            ["kind", "reader_id", "book_id"],
+            select(literal("hold_ready"), allocated.c.reader_id, allocated.c.book_id)
+        )
+        .cte("hold_notified")
+    )
+    return allocated, notified
+
+def fulfil_holds(pairs: Sequence, condition=None):
+    # A new loan ends the reader's hold on that book. Holds a concurrent
+    # return is allocating are skipped rather than waited on, which keeps
+    # the Copy/Hold lock order from deadlocking.
+    holds = (
+        select(Hold.id)
+        .where(tuple_(Hold.book_id, Hold.reader_id).in_(pairs))
+        .with_for_update(skip_locked=True)
+    )
+    if condition is not None:
+        holds = holds.where(condition)
+    return delete(Hold).where(Hold.id.in_(holds)).returning(Hold.id)
+
+def schema_columns(cls: ORM_CLS, schema: type[BaseModel]) -> list:
+    return [getattr(cls, name) for name in schema.model_fields]
+
+
+# Pre-built
+
+# Parameter names must not match a column: values passed at execution
+# would otherwise be added to the SET clause of the UPDATE CTEs.
+
+def borrow_statement():
+    # One statement: claiming a copy and inserting the loan run together, so
+    # concurrent borrows can never hand out the same copy. SKIP LOCKED lets
+    # them claim different copies instead of queueing on one row.
+    book_id = bindparam("loan_book_id", type_=Integer)
+    reader_id = bindparam("loan_reader_id", type_=Integer)
+    librarian_id = bindparam("loan_librarian_id", type_=Integer)
+    reader = select(Reader.id, Reader.name).where(Reader.id == reader_id).cte("reader")
+    loans = (
+        select(
+            func.count().label("open_count"),
+            func.coalesce(func.bool_or(BookReader.book_id == book_id), False).label("has_book")
+        )
+        .where(BookReader.reader_id == reader_id)
+        .where(BookReader.returned == False)
+        .cte("loans")
+    )
+    # A copy set aside for the reader's hold is taken before any free one.
+    ready = (
+        select(Hold.copy_id)
+        .where(Hold.book_id == book_id)
+        .where(Hold.reader_id == reader_id)
+        .where(Hold.copy_id.is_not(None))
+        .with_for_update()
+        .cte("ready")
+    )
+    free = (
+        select(Copy.id)
+        .where(Copy.book_id == book_id)
+        .where(Copy.status == "available")
+        .where(~exists(select(ready.c.copy_id)))
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .cte("free")
+    )
+    available = or_(exists(select(free.c.id)), exists(select(ready.c.copy_id)))
+    # The loan count above comes from the statement's snapshot, so two
+    # concurrent borrows could both see room. The counter upsert re-checks
+    # the limit under the reader's row lock and gates the claim.
+    counted = (
+        pg_insert(ReaderStats)
+        .from_select(
+            ["reader_id", "borrow_count", "open_loans"],
+            select(reader_id, literal(1), literal(1))
+            .where(exists(select(reader.c.id)))
+            .where(select(loans.c.open_count).scalar_subquery() < BORROW_LIMIT)
+            .where(~select(loans.c.has_book).scalar_subquery())
+            .where(available)
+        )
+        .on_conflict_do_update(
+            index_elements=[ReaderStats.reader_id],
+            set_={
+                "borrow_count": ReaderStats.borrow_count + 1,
+                "open_loans": ReaderStats.open_loans + 1
+            },
+            where=ReaderStats.open_loans < BORROW_LIMIT
+        )
+        .returning(ReaderStats.reader_id)
+        .cte("counted")
+    )
+    claimed = (
+        update(Copy)
+        .where(or_(Copy.id.in_(select(free.c.id)), Copy.id.in_(select(ready.c.copy_id))))
+        .where(exists(select(counted.c.reader_id)))
+        .values(status="on_loan")
+        .returning(Copy.id, Copy.book_id)
+        .cte("claimed")
+    )
+    loan = (
+        insert(BookReader)
+        .from_select(
+            ["book_id", "reader_id", "copy_id", "librarian_id", "borrow_date", "due_date", "returned"],
+            select(
+                claimed.c.book_id,
+                reader_id,
+                claimed.c.id,
+                librarian_id,
+                func.now(),
+                loan_due_date(),
+                false()
+            )
+        )
+        .returning(BookReader.book_id)
+        .cte("loan")
+    )
+    book_counted = (
+        insert(PendingBorrow)
+        .from_select(["book_id"], select(loan.c.book_id))
+        .cte("book_counted")
+    )
+    held = fulfil_holds(
+        [tuple_(book_id, reader_id)], exists(select(loan.c.book_id))
+    ).cte("held")
+    return select(
+        exists(select(loan.c.book_id)).label("borrowed"),
+        exists(select(Book.id).where(Book.id == book_id)).label("book_exists"),
+        select(reader.c.name).scalar_subquery().label("reader_name"),
+        select(loans.c.open_count).scalar_subquery().label("open_count"),
+        select(loans.c.has_book).scalar_subquery().label("has_book"),
+        available.label("available"),
+        open_loan_holders(book_id)
+    ).add_cte(book_counted, held)
+
+def return_statement():
+    book_id = bindparam("loan_book_id", type_=Integer)
+    reader_id = bindparam("loan_reader_id", type_=Integer)
+    loan = (
+        update(BookReader)
+        .where(BookReader.book_id == book_id)
+        .where(BookReader.reader_id == reader_id)
+        .where(BookReader.returned == False)
+        .values(
+            returned=True,
+            return_date=func.now(),
+            librarian_id=bindparam("loan_librarian_id", type_=Integer)
+        )
+        .returning(BookReader.book_id, BookReader.copy_id)
+        .cte("loan")
+    )
+    allocated, hold_notified = allocate_holds(
+        book_id, select(loan.c.copy_id).scalar_subquery(), exists(select(loan.c.copy_id))
+    )
+    shelved = (
+        update(Copy)
+        .where(Copy.id.in_(select(loan.c.copy_id)))
+        .values(status=case((exists(select(allocated.c.id)), "held"), else_="available"))
+        .cte("shelved")
+    )
+    reader_counted = (
+        update(ReaderStats)
+        .where(ReaderStats.reader_id == reader_id)
+        .where(exists(select(loan.c.book_id)))
+        .values(open_loans=ReaderStats.open_loans - 1)
+        .cte("reader_counted")
+    )
+    return select(
+        exists(select(loan.c.book_id)).label("returned"),
+        exists(select(Book.id).where(Book.id == book_id)).label("book_exists"),
+        exists(select(Reader.id).where(Reader.id == reader_id)).label("reader_exists"),
+        open_loan_holders(book_id)
+    ).add_cte(shelved, reader_counted, hold_notified)
+
+@cache
+def user_by_email(cls: ORM_CLS):
+    # Case-insensitive through the normalized column's index; an exact
+    # match wins if older accounts differ only by case.
+    return (
+        select(cls)
+        .where(cls.email_normalized == bindparam("email_normalized"))
+        .order_by(cls.email != bindparam("email"), cls.id)
+        .limit(1)
+    )
+
+@cache
+def items_page(cls: ORM_CLS, schema: type[BaseModel], after: bool):
+    # Plain column rows skip the ORM identity map; they carry exactly the
+    # fields of the response schema.
+    query = (
+        select(*schema_columns(cls, schema))
+        .order_by(cls.id)
+        .limit(bindparam("limit", type_=Integer))
+    )
+    if after:
+        query = query.where(cls.id > bindparam("after_id", type_=Integer))
+    return query
+
+BORROW = borrow_statement()
+RETURN = return_statement()
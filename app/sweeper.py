@@ -0,0 +1,134 @@
+"""Record overdue loans in the notifications outbox and fold pending
+borrows into book_stats.
+
+Runs in the background of every app worker (see OVERDUE_SWEEP_INTERVAL_SECONDS),
+or once from the command line:
+    python -m app.sweeper [--batch-size 500]
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import select, update, insert, delete, func, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import settings
+from app.database import Session
+from app.models import BookReader, BookStats, Notification, PendingBorrow
+
+
+logger = logging.getLogger("app.sweeper")
+
+OVERDUE_KIND = "loan_overdue"
+
+
+async def sweep_batch(session: Session, batch_size: int) -> int:
+    # SKIP LOCKED lets workers sweeping at the same time split the backlog
+    # instead of queueing on each other's rows.
+    batch = (
+        select(BookReader.id)
+        .where(BookReader.returned == False)
+        .where(BookReader.overdue_notified_at.is_(None))
+        .where(BookReader.due_date < func.now())
+        .order_by(BookReader.due_date)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    marked = (
+        update(BookReader)
+        .where(BookReader.id.in_(batch.scalar_subquery()))
+        .values(overdue_notified_at=func.now())
+        .returning(BookReader.id, BookReader.book_id, BookReader.reader_id)
+        .cte("marked")
+    )
+    query = (
+        insert(Notification)
+        .from_select(
+            ["kind", "loan_id", "book_id", "reader_id"],
+            select(literal(OVERDUE_KIND), marked.c.id, marked.c.book_id, marked.c.reader_id)
+        )
+        .returning(Notification.id)
+    )
+    result = await session.execute(query)
+    count = len(result.all())
+    await session.commit()
+    return count
+
+async def sweep_overdue(batch_size: int = settings.OVERDUE_SWEEP_BATCH_SIZE) -> int:
+    total = 0
+    async with Session() as session:
+        while count := await sweep_batch(session, batch_size):
+            total += count
+    return total
+
+async def fold_batch(session: Session, batch_size: int) -> int:
+    # Only the sweeper touches a book_stats row for borrows, once per batch;
+    # the totals are upserted in book order so concurrent sweepers take the
+    # row locks in the same order.
+    batch = (
+        select(PendingBorrow.id)
+        .order_by(PendingBorrow.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    folded = (
+        delete(PendingBorrow)
+        .where(PendingBorrow.id.in_(batch.scalar_subquery()))
+        .returning(PendingBorrow.book_id, PendingBorrow.borrow_count)
+        .cte("folded")
+    )
+    totals = (
+        select(folded.c.book_id, func.sum(folded.c.borrow_count))
+        .group_by(folded.c.book_id)
+        .order_by(folded.c.book_id)
+    )
+    counted = pg_insert(BookStats).from_select(["book_id", "borrow_count"], totals)
+    counted = counted.on_conflict_do_update(
+        index_elements=[BookStats.book_id],
+        set_={"borrow_count": BookStats.borrow_count + counted.excluded.borrow_count}
+    ).cte("counted")
+    count = await session.scalar(select(func.count()).select_from(folded).add_cte(counted))
+    await session.commit()
+    return count
+
+async def fold_borrows(batch_size: int = settings.OVERDUE_SWEEP_BATCH_SIZE) -> int:
+    total = 0
+    async with Session() as session:
+        while count := await fold_batch(session, batch_size):
+            total += count
+    return total
+
+async def run_sweeper(interval: float = settings.OVERDUE_SWEEP_INTERVAL_SECONDS):
+    # Each batch is a short transaction on a pooled connection, so requests
+    # only ever wait for one batch's worth of pool time.
+    while True:
+        try:
+            total = await sweep_overdue()
+            if total:
+                logger.info("Recorded %d overdue loans", total)
+        except Exception:
+            logger.exception("Overdue sweep failed")
+        try:
+            await fold_borrows()
+        except Exception:
+            logger.exception("Folding borrow counts failed")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record overdue loans in the outbox and fold pending borrows into book_stats"
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.OVERDUE_SWEEP_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def sweep():
+        return await sweep_overdue(args.batch_size), await fold_borrows(args.batch_size)
+
+    total, folded = asyncio.run(sweep())
+    print(f"Recorded {total} overdue loans")
+    print(f"Folded {folded} pending borrow records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, contextmanager
+
+from fastapi import FastAPI, HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import crud
+from app.config import settings
+from app.database import Session, ReadSession, engines
+from app.metrics import Gauge
+from app.models import Book, Reader, User
+from app.routers import rows_adapter
+from app.schemas import (
+    GetBook, ReadersList, BookCirculation, ReaderCirculation, OverdueLoan
+)
+
+
+# A child of uvicorn's own logger, so the phase timings show up next to
+# "Application startup complete" at uvicorn's default INFO level.
+logger = logging.getLogger("uvicorn.error.startup")
+
+STARTUP_SECONDS = Gauge("app_startup_seconds", "Time spent in each start-up phase")
+
+WARMUP_TIMEOUT_SECONDS = 10
+
+LIST_SCHEMAS = (GetBook, ReadersList, BookCirculation, ReaderCirculation, OverdueLoan)
+
+# Every hot crud path runs once against ids that cannot exist. That fills
+# SQLAlchemy's compiled cache and asyncpg's statement cache without side
+# effects; the write paths fail their checks and are rolled back.
+READ_PATHS = (
+    lambda session: crud.get_items(session, Book, GetBook, limit=1),
+    lambda session: crud.get_items(session, Reader, ReadersList, limit=1),
+    lambda session: crud.get_item(session, Book, 0),
+    lambda session: crud.get_reader_details(session, 0),
+    lambda session: crud.search_books(session, "warmup", 1),
+    lambda session: crud.search_readers(session, "warmup", limit=1),
+    lambda session: crud.get_popular_books(session, 1),
+    lambda session: crud.get_active_readers(session, 1),
+    lambda session: crud.get_overdue_loans(session, None, 1),
+)
+WRITE_PATHS = (
+    lambda session: crud.get_item(session, User, 0),
+    lambda session: crud.get_user_by_email(session, User, "warmup@invalid"),
+    lambda session: crud.borrow_book(session, 0, 0, 0),
+    lambda session: crud.return_book(session, 0, 0, 0),
+)
+
+
+def report_phase(name: str, seconds: float):
+    STARTUP_SECONDS.set(seconds, phase=name)
+    logger.info("Startup phase %s took %.1f ms", name, seconds * 1000)
+
+@contextmanager
+def phase(name: str):
+    started_at = time.perf_counter()
+    yield
+    report_phase(name, time.perf_counter() - started_at)
+
+async def open_connections(count: int):
+    # Connections are held together so the pool has to open `count` of
+    # them, then all go back to it for the first requests to reuse.
+    async with AsyncExitStack() as stack:
+        for engine in engines.values():
+            await asyncio.gather(*(
+                stack.enter_async_context(engine.connect()) for _ in range(count)
+            ))
+
+async def run_paths(session_factory, paths):
+    async with session_factory() as session:
+        for path in paths:
+            try:
+                await path(session)
+            except HTTPException:
+                pass
+            except SQLAlchemyError:
+                logger.warning("Warm-up query failed", exc_info=True)
+            await session.rollback()
+
+async def warm_up(app: FastAPI):
+    started_at = time.perf_counter()
+    try:
+        async with asyncio.timeout(WARMUP_TIMEOUT_SECONDS):
+            with phase("connections"):
+                await open_connections(min(settings.DB_POOL_MIN_SIZE, settings.DB_POOL_SIZE))
+            with phase("queries"):
+                await run_paths(ReadSession, READ_PATHS)
+                await run_paths(Session, WRITE_PATHS)
+    except (OSError, SQLAlchemyError, TimeoutError):
+        # /ready reports the database; the app still starts without it.
+        logger.warning("Database warm-up skipped", exc_info=True)
+    with phase("openapi"):
+        app.openapi()
+    with phase("schemas"):
+        for schema in LIST_SCHEMAS:
+            rows_adapter(schema)
+    report_phase("warmup", time.perf_counter() - started_at)
@@ -0,0 +1,468 @@
+"""Load-test harness for the library API.
+
+Usage:
+    python -m benchmarks run [--seed] [--copies 5] [--target inprocess|uvicorn|http://host:port]
+                             [--scenarios catalog_browse,borrow_return] [--output result.json]
+    python -m benchmarks startup [--runs 5]
+    python -m benchmarks statements [--iterations 2000]
+    python -m benchmarks catalog [--rows 2000] [--target inprocess|uvicorn|http://host:port]
+    python -m benchmarks compare base.json head.json
+
+--seed wipes the configured database, so point it at a throwaway one.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import math
+import os
+import random
+import re
+import statistics
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from sqlalchemy import text
+
+from app.database import Session
+from benchmarks.scenarios import SCENARIOS, Dataset, Recorder
+from benchmarks.seed import BENCH_PASSWORD, COPIES_PER_BOOK, book_records, seed, user_email
+
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+LOCK_WAITERS = text(
+    "SELECT count(*) FROM pg_stat_activity "
+    "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+def latency_summary(values: list[float]) -> dict:
+    return {
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+    }
+
+def metric_total(text: str, name: str) -> float:
+    # Scrapes of /metrics itself are left out of the request count.
+    total = 0.0
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match and match[1] == name and 'route="/metrics"' not in match[2]:
+            total += float(match[3])
+    return total
+
+async def scrape(client: httpx.AsyncClient) -> tuple[float, float]:
+    text = (await client.get("/metrics")).text
+    return (
+        metric_total(text, "http_request_duration_seconds_count"),
+        metric_total(text, "db_statement_duration_seconds_count"),
+    )
+
+async def sample_lock_waiters(samples: list[int]):
+    # Backends queued on a row or table lock, polled while a scenario runs;
+    # a hot row shows up here long before it caps throughput.
+    async with Session() as session:
+        while True:
+            samples.append(await session.scalar(LOCK_WAITERS))
+            await session.rollback()
+            await asyncio.sleep(0.05)
+
+def git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ], env={**os.environ, "RATE_LIMIT_ENABLED": "false"})
+
+@asynccontextmanager
+async def open_client(target: str):
+    timeout = httpx.Timeout(60)
+    if target == "inprocess":
+        from app.config import settings
+
+        settings.RATE_LIMIT_ENABLED = False
+        from app.main import app
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            yield client
+        return
+    if target != "uvicorn":
+        async with httpx.AsyncClient(base_url=target, timeout=timeout) as client:
+            yield client
+        return
+    # A single worker keeps /metrics complete: counters are per process.
+    port = free_port()
+    server = start_server(port)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
+
+async def log_in(client: httpx.AsyncClient):
+    response = await client.post(
+        "/api/v1/login", json={"email": user_email(1), "password": BENCH_PASSWORD}
+    )
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()}"
+
+async def run_scenario(
+        client: httpx.AsyncClient,
+        name: str,
+        data: Dataset,
+        concurrency: int,
+        duration: float
+) -> dict:
+    scenario = SCENARIOS[name]
+    recorder = Recorder()
+
+    async def worker(number: int):
+        rng = random.Random(number)
+        while time.perf_counter() < deadline:
+            await scenario(client, recorder, data, rng)
+
+    requests_before, statements_before = await scrape(client)
+    lock_waiters = []
+    sampler = asyncio.create_task(sample_lock_waiters(lock_waiters))
+    started_at = time.perf_counter()
+    deadline = started_at + duration
+    try:
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    finally:
+        sampler.cancel()
+        with suppress(asyncio.CancelledError):
+            await sampler
+    elapsed = time.perf_counter() - started_at
+    requests_after, statements_after = await scrape(client)
+
+    latencies = [value for values in recorder.latencies.values() for value in values]
+    served = requests_after - requests_before
+    return {
+        "requests": len(latencies),
+        "errors": sum(recorder.errors.values()),
+        "throughput": round(len(latencies) / elapsed, 2),
+        "sql_per_request": round((statements_after - statements_before) / served, 2) if served else None,
+        "lock_waiters": round(statistics.mean(lock_waiters), 2) if lock_waiters else None,
+        **latency_summary(latencies),
+        "operations": {
+            operation: {
+                "requests": len(values),
+                "errors": recorder.errors.get(operation, 0),
+                **latency_summary(values),
+            }
+            for operation, values in recorder.latencies.items()
+        },
+    }
+
+async def run(args) -> dict:
+    data = Dataset(args.books, args.readers, args.users, min(args.hot_books, args.books))
+    if args.seed:
+        await seed(args.books, args.readers, args.loans, args.users, args.copies)
+    results = {}
+    async with open_client(args.target) as client:
+        await log_in(client)
+        for name in args.scenarios:
+            results[name] = await run_scenario(
+                client, name, data, args.concurrency, args.duration
+            )
+            print(f"{name}: {json.dumps({k: v for k, v in results[name].items() if k != 'operations'})}")
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.target,
+        "dataset": {
+            "books": args.books, "readers": args.readers, "loans": args.loans,
+            "users": args.users, "copies": args.copies, "hot_books": data.hot_books,
+        },
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "scenarios": results,
+    }
+
+async def measure_startup() -> dict:
+    # Time from spawning a fresh server to its first 200 on /ready, then
+    # the latency of the first request on each hot path.
+    port = free_port()
+    started_at = time.perf_counter()
+    server = start_server(port)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("server exited during startup")
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.01)
+            timings = {"first_200_ms": (time.perf_counter() - started_at) * 1000}
+
+            async def first(name: str, method: str, url: str, **kwargs) -> httpx.Response:
+                request_started_at = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                timings[f"{name}_ms"] = (time.perf_counter() - request_started_at) * 1000
+                response.raise_for_status()
+                return response
+
+            await first("openapi", "GET", "/openapi.json")
+            response = await first(
+                "login", "POST", "/api/v1/login",
+                json={"email": user_email(1), "password": BENCH_PASSWORD}
+            )
+            client.headers["Authorization"] = f"Bearer {response.json()}"
+            await first("list_books", "GET", "/api/v1/books", params={"limit": 50})
+            await first("get_book", "GET", "/api/v1/books/1")
+            await first("get_reader", "GET", "/api/v1/readers/1")
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+async def run_startup(runs: int) -> dict:
+    samples = [await measure_startup() for _ in range(runs)]
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "runs": runs,
+        "median": {
+            name: round(statistics.median(sample[name] for sample in samples), 2)
+            for name in samples[0]
+        },
+        "samples": samples,
+    }
+
+def hot_statements() -> dict:
+    # Each hot path as (fresh build, pre-built statement, parameters); the
+    # fresh build is what every call did before the statements were kept.
+    from app import statements
+    from app.models import Book, User
+    from app.schemas import GetBook
+
+    loan = {"loan_book_id": 0, "loan_reader_id": 0, "loan_librarian_id": 0}
+    return {
+        "borrow_book": (statements.borrow_statement, statements.BORROW, loan),
+        "return_book": (statements.return_statement, statements.RETURN, loan),
+        "get_user_by_email": (
+            lambda: statements.user_by_email.__wrapped__(User),
+            statements.user_by_email(User),
+            {"email_normalized": "bench@invalid", "email": "bench@invalid"}
+        ),
+        "get_items": (
+            lambda: statements.items_page.__wrapped__(Book, GetBook, True),
+            statements.items_page(Book, GetBook, True),
+            {"limit": 51, "after_id": 0}
+        ),
+    }
+
+async def run_statements(iterations: int) -> dict:
+    # python_us is building the statement plus deriving its cache key, the
+    # part of a call that differs; execute_us is a full round trip against
+    # ids that do not exist, rolled back each time.
+    from app.database import Session
+
+    def per_call_us(elapsed: float) -> float:
+        return round(elapsed / iterations * 1e6, 2)
+
+    results = {}
+    async with Session() as session:
+        for name, (build, prebuilt, params) in hot_statements().items():
+            timings = {}
+            for variant, statement in (("built", build), ("prebuilt", lambda: prebuilt)):
+                started_at = time.perf_counter()
+                for _ in range(iterations):
+                    statement()._generate_cache_key()
+                timings[f"{variant}_python_us"] = per_call_us(time.perf_counter() - started_at)
+                await session.execute(statement(), params)
+                await session.rollback()
+                started_at = time.perf_counter()
+                for _ in range(iterations):
+                    await session.execute(statement(), params)
+                    await session.rollback()
+                timings[f"{variant}_execute_us"] = per_call_us(time.perf_counter() - started_at)
+            results[name] = timings
+            print(f"{name}: {json.dumps(timings)}")
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "iterations": iterations,
+        "statements": results,
+    }
+
+def catalog_books(count: int, prefix: str) -> list[dict]:
+    return [
+        {
+            "title": title,
+            "release_year": release_year,
+            "authors": authors,
+            "isbn": f"{prefix}{number:08d}",
+            "available_stock": 1,
+        }
+        for number, (title, release_year, authors, _, _) in enumerate(
+            book_records(count, random.Random(0))
+        )
+    ]
+
+async def run_catalog(args) -> dict:
+    # The same number of new titles through one streamed /books/import and
+    # through one POST /books per row, the path imports took before.
+    # ISBNs carry a per-run prefix so every run inserts.
+    books = catalog_books(2 * args.rows, f"9{int(time.time()) % 10000:04d}")
+    bulk, per_row = books[:args.rows], books[args.rows:]
+    body = io.StringIO()
+    writer = csv.DictWriter(body, fieldnames=list(bulk[0]))
+    writer.writeheader()
+    writer.writerows(bulk)
+
+    def rate(started_at: float) -> dict:
+        elapsed = time.perf_counter() - started_at
+        return {"seconds": round(elapsed, 3), "rows_per_sec": round(args.rows / elapsed, 1)}
+
+    async with open_client(args.target) as client:
+        await log_in(client)
+        started_at = time.perf_counter()
+        response = await client.post("/api/v1/books/import", content=body.getvalue().encode())
+        response.raise_for_status()
+        results = {"bulk": rate(started_at)}
+        if response.json()["inserted"] != args.rows:
+            raise RuntimeError(f"import inserted {response.json()['inserted']} of {args.rows} rows")
+
+        remaining = iter(per_row)
+
+        async def worker():
+            for book in remaining:
+                (await client.post("/api/v1/books", json=book)).raise_for_status()
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        results["per_row"] = rate(started_at)
+    results["speedup"] = round(
+        results["bulk"]["rows_per_sec"] / results["per_row"]["rows_per_sec"], 1
+    )
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.target,
+        "rows": args.rows,
+        "concurrency": args.concurrency,
+        "catalog": results,
+    }
+
+def compare(base: dict, head: dict):
+    print(f"{'scenario':<16}{'metric':<18}{base['commit'] or 'base':>12}{head['commit'] or 'head':>12}{'change':>10}")
+    for name in [name for name in base["scenarios"] if name in head["scenarios"]]:
+        for metric in ("throughput", "p50_ms", "p95_ms", "p99_ms", "sql_per_request", "lock_waiters"):
+            before = base["scenarios"][name].get(metric)
+            after = head["scenarios"][name].get(metric)
+            change = f"{(after - before) / before:+.1%}" if before and after is not None else "-"
+            print(f"{name:<16}{metric:<18}{before!s:>12}{after!s:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the library API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run scenarios and save the results as JSON")
+    run_parser.add_argument(
+        "--target", default="inprocess", help="inprocess, uvicorn, or the base URL of a running server"
+    )
+    run_parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    run_parser.add_argument("--seed", action="store_true", help="Wipe and reseed the database first")
+    run_parser.add_argument("--books", type=int, default=10000)
+    run_parser.add_argument("--readers", type=int, default=2000)
+    run_parser.add_argument("--loans", type=int, default=50000)
+    run_parser.add_argument("--users", type=int, default=20)
+    run_parser.add_argument("--copies", type=int, default=COPIES_PER_BOOK, help="Copies of each seeded title")
+    run_parser.add_argument("--hot-books", type=int, default=5)
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    run_parser.add_argument("--output", help="Defaults to benchmarks/results/<commit>.json")
+    startup_parser = commands.add_parser(
+        "startup", help="Measure time to the first 200 of a fresh server (seed first)"
+    )
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.add_argument("--output", help="Defaults to benchmarks/results/startup-<commit>.json")
+    statements_parser = commands.add_parser(
+        "statements", help="Measure per-call overhead of the hot statements, built vs pre-built"
+    )
+    statements_parser.add_argument("--iterations", type=int, default=2000)
+    statements_parser.add_argument(
+        "--output", help="Defaults to benchmarks/results/statements-<commit>.json"
+    )
+    catalog_parser = commands.add_parser(
+        "catalog", help="Compare rows/sec of the bulk catalog import with per-row POST /books"
+    )
+    catalog_parser.add_argument("--target", default="inprocess")
+    catalog_parser.add_argument("--rows", type=int, default=2000)
+    catalog_parser.add_argument(
+        "--concurrency", type=int, default=16, help="Parallel requests on the per-row path"
+    )
+    catalog_parser.add_argument("--output", help="Defaults to benchmarks/results/catalog-<commit>.json")
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(*(json.loads(Path(path).read_text()) for path in (args.base, args.head)))
+        return
+    if args.command in ("startup", "statements", "catalog"):
+        if args.command == "startup":
+            result = asyncio.run(run_startup(args.runs))
+            print(json.dumps(result["median"]))
+        elif args.command == "statements":
+            result = asyncio.run(run_statements(args.iterations))
+        else:
+            result = asyncio.run(run_catalog(args))
+            print(json.dumps(result["catalog"]))
+        output = Path(
+            args.output or RESULTS_DIR / f"{args.command}-{result['commit'] or 'results'}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(result, indent=2))
+        print(f"Saved {output}")
+        return
+    args.scenarios = args.scenarios.split(",")
+    unknown = set(args.scenarios) - SCENARIOS.keys()
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    result = asyncio.run(run(args))
+    output = Path(args.output or RESULTS_DIR / f"{result['commit'] or 'results'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import httpx
+
+from benchmarks.seed import BENCH_PASSWORD, WORDS, user_email
+
+
+@dataclass
+class Dataset:
+    books: int
+    readers: int
+    users: int
+    hot_books: int
+
+
+@dataclass
+class Recorder:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    async def request(
+            self,
+            client: httpx.AsyncClient,
+            operation: str,
+            method: str,
+            url: str,
+            expected: tuple[int, ...] = (200,),
+            **kwargs
+    ) -> httpx.Response:
+        started_at = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[operation].append(time.perf_counter() - started_at)
+        if response.status_code not in expected:
+            self.errors[operation] += 1
+        return response
+
+
+async def login_storm(client, recorder: Recorder, data: Dataset, rng: random.Random):
+    await recorder.request(
+        client, "login", "POST", "/api/v1/login",
+        json={"email": user_email(rng.randint(1, data.users)), "password": BENCH_PASSWORD}
+    )
+
+async def catalog_browse(client, recorder: Recorder, data: Dataset, rng: random.Random):
+    roll = rng.random()
+    if roll < 0.4:
+        await recorder.request(
+            client, "list_books", "GET", "/api/v1/books",
+            params={"after_id": rng.randint(0, max(data.books - 50, 0)), "limit": 50}
+        )
+    elif roll < 0.8:
+        await recorder.request(
+            client, "get_book", "GET", f"/api/v1/books/{rng.randint(1, data.books)}"
+        )
+    else:
+        await recorder.request(
+            client, "search_books", "GET", "/api/v1/books/search",
+            params={"q": rng.choice(WORDS)}
+        )
+
+async def borrow_return(client, recorder: Recorder, data: Dataset, rng: random.Random):
+    # Every worker fights over the same few titles, so stock checks,
+    # row locks and the per-reader limit all come into play.
+    loan = {
+        "book_id": rng.randint(1, data.hot_books),
+        "reader_id": rng.randint(1, data.readers),
+    }
+    response = await recorder.request(
+        client, "borrow", "POST", "/api/v1/borrow", expected=(200, 400), params=loan
+    )
+    if response.status_code == 200:
+        await recorder.request(client, "return", "POST", "/api/v1/return", params=loan)
+
+async def reader_profile(client, recorder: Recorder, data: Dataset, rng: random.Random):
+    await recorder.request(
+        client, "get_reader", "GET", f"/api/v1/readers/{rng.randint(1, data.readers)}"
+    )
+
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "catalog_browse": catalog_browse,
+    "borrow_return": borrow_return,
+    "reader_profile": reader_profile,
+}
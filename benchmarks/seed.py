@@ -0,0 +1,133 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import bcrypt
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import Session
+
+
+BENCH_PASSWORD = "benchmark1"
+
+WORDS = (
+    "river", "shadow", "garden", "empire", "winter", "machine", "silent", "golden",
+    "ocean", "forest", "night", "city", "glass", "storm", "memory", "stone",
+)
+
+TRUNCATE = text(
+    "TRUNCATE book_reader, book_reader_archive, copies, books, readers, users "
+    "RESTART IDENTITY CASCADE"
+)
+
+COPIES_PER_BOOK = 5
+
+# The seeded loans bypass crud, so their copies and the circulation
+# counters are rebuilt.
+REBUILD_STATS = (
+    text("""
+        INSERT INTO copies (book_id)
+        SELECT books.id FROM books CROSS JOIN generate_series(1, :copies)
+    """).bindparams(copies=COPIES_PER_BOOK),
+    text("""
+        WITH loans AS (
+            SELECT id, book_id, nextval(pg_get_serial_sequence('copies', 'id')) AS copy_id
+            FROM book_reader
+            WHERE NOT returned
+        ), created AS (
+            INSERT INTO copies (id, book_id, status)
+            SELECT copy_id, book_id, 'on_loan' FROM loans
+        )
+        UPDATE book_reader SET copy_id = loans.copy_id
+        FROM loans
+        WHERE book_reader.id = loans.id
+    """),
+    text("""
+        INSERT INTO book_stats (book_id, borrow_count)
+        SELECT book_id, count(*) FROM book_reader GROUP BY book_id
+    """),
+    text("""
+        INSERT INTO reader_stats (reader_id, borrow_count, open_loans)
+        SELECT reader_id, count(*), count(*) FILTER (WHERE NOT returned)
+        FROM book_reader GROUP BY reader_id
+    """),
+)
+
+
+def user_email(number: int) -> str:
+    return f"bench{number}@example.com"
+
+def book_records(count: int, rng: random.Random):
+    for number in range(count):
+        title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {number}"
+        authors = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"
+        yield (title, rng.randint(1900, 2025), authors, None, f"{number:013d}")
+
+def loan_records(count: int, books: int, readers: int, rng: random.Random):
+    # The first loan of every reader stays open; the rest are history.
+    now = datetime.now(timezone.utc)
+    for number in range(count):
+        borrowed_at = now - timedelta(days=rng.randint(1, 720))
+        returned = number >= readers
+        yield (
+            number % books + 1,
+            number % readers + 1,
+            borrowed_at,
+            borrowed_at + timedelta(days=settings.LOAN_PERIOD_DAYS),
+            returned,
+            borrowed_at + timedelta(days=14) if returned else None,
+            1,
+        )
+
+async def seed(
+        books: int,
+        readers: int,
+        loans: int,
+        users: int,
+        copies: int = COPIES_PER_BOOK,
+        rng_seed: int = 0
+):
+    """Replace the contents of the configured database with synthetic data."""
+    rng = random.Random(rng_seed)
+    password = bcrypt.hashpw(
+        BENCH_PASSWORD.encode(), bcrypt.gensalt(settings.BCRYPT_ROUNDS)
+    ).decode()
+    now = datetime.now(timezone.utc)
+    async with Session() as session:
+        await session.execute(TRUNCATE)
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+        await driver.copy_records_to_table(
+            "users",
+            records=[
+                (f"Bench {number}", user_email(number), password, now)
+                for number in range(1, users + 1)
+            ],
+            columns=("name", "email", "password", "registered_at")
+        )
+        await driver.copy_records_to_table(
+            "books",
+            records=book_records(books, rng),
+            columns=("title", "release_year", "authors", "description", "isbn")
+        )
+        await driver.copy_records_to_table(
+            "readers",
+            records=[
+                (f"Reader {number}", f"reader{number}@example.com", now)
+                for number in range(1, readers + 1)
+            ],
+            columns=("name", "email", "created_at")
+        )
+        await driver.copy_records_to_table(
+            "book_reader",
+            records=loan_records(loans, books, readers, rng),
+            columns=(
+                "book_id", "reader_id", "borrow_date", "due_date", "returned", "return_date",
+                "librarian_id"
+            )
+        )
+        for statement in REBUILD_STATS:
+            await session.execute(statement.params(copies=copies))
+        await session.commit()
+        await session.execute(text("ANALYZE"))
@@ -1,5 +1,18 @@
 #!/bin/bash
 
+if [ "${APP_MODE:-development}" = "production" ]; then
+    # Apply the migrations shipped in the image; concurrent replicas wait on
+    # an advisory lock in alembic/env.py instead of racing each other.
+    echo "Applying migrations..."
+    alembic -c /app/alembic.ini upgrade head || exit 1
+
+    WORKERS=${WEB_CONCURRENCY:-$(nproc)}
+    echo "Starting FastAPI app with $WORKERS workers..."
+    exec uvicorn app.main:app --host 0.0.0.0 --port 80 \
+        --workers "$WORKERS" \
+        --timeout-graceful-shutdown "${GRACEFUL_SHUTDOWN_TIMEOUT:-30}"
+fi
+
 echo "Initializing head..."
 alembic -c /app/alembic.ini upgrade head
 
@@ -14,4 +27,4 @@ echo "Starting FastAPI app..."
 uvicorn app.main:app --host 0.0.0.0 --port 80 --reload
 echo "App started..."
 
-exec "$@"
\ No newline at end of file
+exec "$@"
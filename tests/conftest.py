@@ -0,0 +1,117 @@
+import os
+
+# Settings are read when app.config is imported, so the test defaults have
+# to be in place first. The database comes from the usual POSTGRES_* vars.
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+import pytest
+from sqlalchemy import event, text
+
+from app.auth import principal_cache, token_cache
+from app.cache import detail_cache
+from app.database import Base, engine, engines
+from app.main import app
+
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def database():
+    # Every test starts from empty tables; the schema itself comes from
+    # `alembic upgrade head`.
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+    except OSError as err:
+        pytest.skip(f"Postgres is not reachable: {err}")
+    await detail_cache.close()
+    token_cache.clear()
+    principal_cache.clear()
+    yield
+    # Pooled connections belong to this test's event loop.
+    for db_engine in engines.values():
+        await db_engine.dispose()
+
+@pytest.fixture
+async def client(database):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+@pytest.fixture
+async def librarian(client) -> int:
+    user = {"email": "librarian@example.com", "password": PASSWORD, "name": "Librarian"}
+    response = await client.post("/api/v1/register", json=user)
+    response.raise_for_status()
+    login = await client.post("/api/v1/login", json={"email": user["email"], "password": PASSWORD})
+    login.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {login.json()}"
+    return response.json()["id"]
+
+@pytest.fixture
+def add_book(client, librarian):
+    count = 0
+
+    async def add(stock: int = 1, **values) -> int:
+        nonlocal count
+        count += 1
+        book = {
+            "title": f"Book {count}",
+            "release_year": 2000,
+            "authors": "Author",
+            "isbn": f"{count:013d}",
+            "available_stock": stock,
+            **values,
+        }
+        response = await client.post("/api/v1/books", json=book)
+        response.raise_for_status()
+        return response.json()["id"]
+    return add
+
+@pytest.fixture
+def add_reader(client, librarian):
+    count = 0
+
+    async def add(**values) -> int:
+        nonlocal count
+        count += 1
+        reader = {"name": f"Reader {count}", "email": f"reader{count}@example.com", **values}
+        response = await client.post("/api/v1/readers", json=reader)
+        response.raise_for_status()
+        return response.json()["id"]
+    return add
+
+@pytest.fixture
+def statements():
+    # Counts the SQL statements sent on the primary engine while the
+    # test's `with statements:` block runs.
+    class Counter:
+        count = 0
+        active = False
+
+        def __enter__(self):
+            self.count = 0
+            self.active = True
+            return self
+
+        def __exit__(self, *exc_info):
+            self.active = False
+
+    counter = Counter()
+
+    def count(*args):
+        if counter.active:
+            counter.count += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    yield counter
+    event.remove(engine.sync_engine, "before_cursor_execute", count)
@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_logins_rehash_once(client, librarian, monkeypatch):
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", settings.BCRYPT_ROUNDS + 1)
+    login = {"email": "librarian@example.com", "password": "secret123"}
+    responses = await asyncio.gather(*(client.post("/api/v1/login", json=login) for _ in range(4)))
+    assert [response.status_code for response in responses] == [200] * 4
+    profile = (await client.get("/api/v1/my_profile")).json()
+    # Rehashing is not an edit, so the profile keeps its version.
+    assert profile["version"] == 1
+    response = await client.post("/api/v1/login", json=login)
+    assert response.status_code == 200
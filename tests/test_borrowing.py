@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def borrow(client, book_id: int, reader_id: int):
+    loan = {"book_id": book_id, "reader_id": reader_id}
+    return await client.post("/api/v1/borrow", params=loan)
+
+async def test_parallel_borrows_never_oversell(client, add_book, add_reader):
+    book_id = await add_book(stock=2)
+    reader_ids = [await add_reader() for _ in range(6)]
+    responses = await asyncio.gather(*(borrow(client, book_id, reader_id) for reader_id in reader_ids))
+    assert sorted(response.status_code for response in responses) == [200] * 2 + [400] * 4
+    assert {
+        response.json()["detail"] for response in responses if response.status_code == 400
+    } == {"Book is not available"}
+    book = (await client.get(f"/api/v1/books/{book_id}")).json()
+    assert book["available_stock"] == 0
+
+async def test_parallel_borrows_respect_reader_limit(client, add_book, add_reader):
+    reader_id = await add_reader()
+    book_ids = [await add_book() for _ in range(6)]
+    responses = await asyncio.gather(*(borrow(client, book_id, reader_id) for book_id in book_ids))
+    assert sorted(response.status_code for response in responses) == [200] * 3 + [400] * 3
+    reader = (await client.get(f"/api/v1/readers/{reader_id}")).json()
+    assert len(reader["books"]) == 3
+    # The copies of the refused borrows are back on the shelf.
+    for response, book_id in zip(responses, book_ids):
+        book = (await client.get(f"/api/v1/books/{book_id}")).json()
+        assert book["available_stock"] == (0 if response.status_code == 200 else 1)
+
+async def borrow_batch(client, *pairs):
+    operations = [{"book_id": book_id, "reader_id": reader_id} for book_id, reader_id in pairs]
+    response = await client.post("/api/v1/borrow/batch", json=operations)
+    response.raise_for_status()
+    return response.json()
+
+async def test_parallel_batches_respect_reader_limit(client, add_book, add_reader):
+    reader_id = await add_reader()
+    book_ids = [await add_book() for _ in range(6)]
+    batch, *singles = await asyncio.gather(
+        borrow_batch(client, *((book_id, reader_id) for book_id in book_ids[:3])),
+        *(borrow(client, book_id, reader_id) for book_id in book_ids[3:])
+    )
+    borrowed = [result["status"] == "ok" for result in batch]
+    borrowed += [response.status_code == 200 for response in singles]
+    assert sum(borrowed) <= 3
+    reader = (await client.get(f"/api/v1/readers/{reader_id}")).json()
+    assert len(reader["books"]) == sum(borrowed)
+
+async def test_parallel_batches_borrowing_the_same_loan(client, add_book, add_reader):
+    reader_id = await add_reader()
+    book_id = await add_book(stock=2)
+    batches = await asyncio.gather(*(borrow_batch(client, (book_id, reader_id)) for _ in range(2)))
+    results = sorted((result["status"], result["detail"]) for [result] in batches)
+    assert results == [("error", "Reader already has this book"), ("ok", None)]
+    # The losing batch gave its loan slot back.
+    book_ids = [await add_book() for _ in range(2)]
+    more = await borrow_batch(client, *((book_id, reader_id) for book_id in book_ids))
+    assert [result["status"] for result in more] == ["ok", "ok"]
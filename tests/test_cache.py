@@ -0,0 +1,49 @@
+import fakeredis
+import pytest
+
+from app import cache, crud
+from app.cache import RedisBackend
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def redis_cache(monkeypatch, database):
+    client = fakeredis.FakeAsyncRedis()
+    backend = RedisBackend(client)
+    monkeypatch.setattr(cache, "detail_cache", backend)
+    monkeypatch.setattr(crud, "detail_cache", backend)
+    yield client
+    await backend.close()
+
+async def test_redis_detail_cache_is_invalidated(
+        redis_cache, client, add_book, add_reader, statements
+):
+    book_id = await add_book(stock=2)
+    reader_id = await add_reader()
+    book_url, reader_url = f"/api/v1/books/{book_id}", f"/api/v1/readers/{reader_id}"
+    loan = {"book_id": book_id, "reader_id": reader_id}
+
+    assert (await client.get(book_url)).json()["available_stock"] == 2
+    assert (await client.get(reader_url)).json()["books"] == []
+    assert await redis_cache.exists(f"library:book:{book_id}", f"library:reader:{reader_id}") == 2
+    with statements:
+        await client.get(book_url)
+        await client.get(reader_url)
+    assert statements.count == 0
+
+    (await client.post("/api/v1/borrow", params=loan)).raise_for_status()
+    assert (await client.get(book_url)).json()["available_stock"] == 1
+    assert [item["book"]["id"] for item in (await client.get(reader_url)).json()["books"]] == [book_id]
+
+    response = await client.patch(book_url, json={"title": "Renamed book"})
+    assert response.status_code == 200
+    assert (await client.get(reader_url)).json()["books"][0]["book"]["title"] == "Renamed book"
+    response = await client.patch(reader_url, json={"name": "Renamed reader"})
+    assert response.status_code == 200
+    assert (await client.get(reader_url)).json()["name"] == "Renamed reader"
+
+    (await client.post("/api/v1/return", params=loan)).raise_for_status()
+    assert (await client.get(book_url)).json()["available_stock"] == 2
+    assert (await client.get(reader_url)).json()["books"] == []
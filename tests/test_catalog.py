@@ -0,0 +1,32 @@
+import pytest
+
+from app.schemas import MAX_STOCK
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_import_rejects_lines_that_are_not_utf8(client, librarian):
+    body = b"\n".join([
+        b"title,release_year,authors,isbn,available_stock",
+        b"Dune,1965,Frank Herbert,9780441013593,2",
+        "Café,1990,Someone,9780000000001,1".encode("latin-1"),
+        b"Emma,1815,Jane Austen,9780141439587,1",
+    ])
+    response = await client.post("/api/v1/books/import", content=body)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert report["rejected"] == [3]
+
+async def test_import_rejects_oversized_stock(client, librarian):
+    body = "\n".join([
+        "title,release_year,authors,isbn,available_stock",
+        f"Dune,1965,Frank Herbert,9780441013593,{MAX_STOCK}",
+        f"Emma,1815,Jane Austen,9780141439587,{MAX_STOCK + 1}",
+        "Ulysses,1922,James Joyce,9780199535675,999999999",
+    ])
+    response = await client.post("/api/v1/books/import", content=body.encode())
+    report = response.json()
+    assert report["inserted"] == 1
+    assert report["rejected"] == [3, 4]
@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.database import engine
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_statements_leave_nothing_on_the_connection(database):
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+        info = (await connection.get_raw_connection()).info
+        before = {key: list(value) if isinstance(value, list) else value for key, value in info.items()}
+        for _ in range(3):
+            with pytest.raises(DBAPIError):
+                await connection.execute(text("SELECT 1 / 0"))
+            await connection.rollback()
+        await connection.execute(text("SELECT 1"))
+        assert info == before
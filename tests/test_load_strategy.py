@@ -0,0 +1,85 @@
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def borrow(client, book_id: int, reader_id: int):
+    loan = {"book_id": book_id, "reader_id": reader_id}
+    response = await client.post("/api/v1/borrow", params=loan)
+    response.raise_for_status()
+
+async def test_lists_take_one_statement(client, add_book, add_reader, statements):
+    for _ in range(3):
+        await add_book()
+        await add_reader()
+    with statements:
+        response = await client.get("/api/v1/books")
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert statements.count == 1
+    with statements:
+        response = await client.get("/api/v1/readers")
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+    assert statements.count == 1
+
+async def test_book_details_statements(client, add_book, add_reader, statements):
+    book_id = await add_book(stock=3)
+    for _ in range(2):
+        await borrow(client, book_id, await add_reader())
+    with statements:
+        response = await client.get(f"/api/v1/books/{book_id}")
+    assert response.json()["available_stock"] == 1
+    assert statements.count == 1
+    with statements:
+        await client.get(f"/api/v1/books/{book_id}")
+    assert statements.count == 0
+
+async def test_reader_details_load_open_loans_in_one_query(
+        client, add_book, add_reader, statements
+):
+    reader_id = await add_reader()
+    for _ in range(3):
+        await borrow(client, await add_book(), reader_id)
+    with statements:
+        response = await client.get(f"/api/v1/readers/{reader_id}")
+    assert len(response.json()["books"]) == 3
+    # The reader, then its open loans with their books.
+    assert statements.count == 2
+    with statements:
+        await client.get(f"/api/v1/readers/{reader_id}")
+    assert statements.count == 0
+
+async def test_reader_history_statements(client, add_book, add_reader, statements):
+    reader_id = await add_reader()
+    book_ids = [await add_book() for _ in range(3)]
+    for book_id in book_ids:
+        await borrow(client, book_id, reader_id)
+        response = await client.post(
+            "/api/v1/return", params={"book_id": book_id, "reader_id": reader_id}
+        )
+        response.raise_for_status()
+    with statements:
+        response = await client.get(
+            f"/api/v1/readers/{reader_id}", params={"with_history": True}
+        )
+    body = response.json()
+    assert [loan["book"]["id"] for loan in body["books"]] == book_ids[::-1]
+    assert body["version"] == 1
+    # The reader, then one page of hot and archived loans.
+    assert statements.count == 2
+
+async def test_update_reader_returns_details(client, add_book, add_reader, statements):
+    reader_id = await add_reader()
+    book_id = await add_book()
+    await borrow(client, book_id, reader_id)
+    with statements:
+        response = await client.patch(f"/api/v1/readers/{reader_id}", json={"name": "Renamed"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["name"] == "Renamed"
+    assert body["version"] == 2
+    assert [loan["book"]["id"] for loan in body["books"]] == [book_id]
+    # The UPDATE, then the reader and its open loans.
+    assert statements.count == 3
@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.database import engine
+from app import main
+from app.main import app
+from app.warmup import STARTUP_SECONDS
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_lifespan_warms_up_before_the_first_request(database, monkeypatch):
+    monkeypatch.setattr(settings, "OVERDUE_SWEEP_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(app, "openapi_schema", None)
+    # Shutdown stops the hashing pool, which later tests still need.
+    monkeypatch.setattr(main, "hash_executor", ThreadPoolExecutor(1))
+    STARTUP_SECONDS.values.clear()
+    await engine.dispose()
+    started_at = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/ready")
+        first_200 = time.perf_counter() - started_at
+        assert response.status_code == 200
+        phases = {dict(labels)["phase"]: seconds for labels, seconds in STARTUP_SECONDS.values.items()}
+        # A phase is only reported when it finished, so "queries" means
+        # the database part of the warm-up did not fail.
+        assert {"import", "connections", "queries", "openapi", "schemas", "warmup"} <= phases.keys()
+        assert phases["warmup"] <= first_200
+        assert app.openapi_schema is not None
+        assert engine.pool.checkedin() >= min(settings.DB_POOL_MIN_SIZE, settings.DB_POOL_SIZE)
@@ -0,0 +1,23 @@
+import pytest
+
+from app.sweeper import fold_borrows
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_borrow_counts_reach_reports_once_folded(client, add_book, add_reader):
+    popular, quiet = await add_book(stock=3), await add_book(stock=3)
+    readers = [await add_reader() for _ in range(3)]
+    for reader_id in readers:
+        loan = {"book_id": popular, "reader_id": reader_id}
+        (await client.post("/api/v1/borrow", params=loan)).raise_for_status()
+    batch = [{"book_id": quiet, "reader_id": readers[0]}, {"book_id": quiet, "reader_id": readers[1]}]
+    response = await client.post("/api/v1/borrow/batch", json=batch)
+    assert [result["status"] for result in response.json()] == ["ok", "ok"]
+    assert (await client.get("/api/v1/reports/popular-books")).json() == []
+
+    assert await fold_borrows(batch_size=2) == 4
+    report = (await client.get("/api/v1/reports/popular-books")).json()
+    assert [(book["id"], book["borrow_count"]) for book in report] == [(popular, 3), (quiet, 2)]
+    assert await fold_borrows() == 0
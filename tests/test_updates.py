@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from app import crud
+from app.database import Session
+from app.models import Book, Reader
+from app.schemas import MAX_STOCK
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reader_details_after_update_in_the_same_session(client, add_book, add_reader):
+    reader_id = await add_reader()
+    book_id = await add_book()
+    response = await client.post("/api/v1/borrow", params={"book_id": book_id, "reader_id": reader_id})
+    response.raise_for_status()
+    async with Session() as session:
+        # Holding the updated reader keeps it in the identity map, as the
+        # PATCH handler does.
+        reader = await crud.update_item(session, Reader, reader_id, {"name": "Renamed"})
+        details, _ = await crud.get_reader_details(session, reader_id)
+        assert details is reader
+        assert details.name == "Renamed"
+        assert [loan.book_id for loan in details.books] == [book_id]
+
+async def test_book_details_after_update_in_the_same_session(client, add_book):
+    book_id = await add_book(stock=2)
+    async with Session() as session:
+        book = await crud.update_item(session, Book, book_id, {"title": "Renamed"})
+        details = json.loads(await crud.get_book_details(session, book_id))
+        assert book.title == "Renamed"
+        assert details["title"] == "Renamed"
+        assert details["available_stock"] == 2
+
+async def test_update_book_returns_details(client, add_book):
+    book_id = await add_book(stock=2)
+    response = await client.patch(
+        f"/api/v1/books/{book_id}", json={"title": "Renamed", "available_stock": 3}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["title"] == "Renamed"
+    assert body["available_stock"] == 3
+    assert body["version"] == 2
+
+async def test_stock_is_capped(client, add_book):
+    book_id = await add_book()
+    too_many = MAX_STOCK + 1
+    book = {"title": "Big", "release_year": 2000, "authors": "A", "isbn": "9999999999999"}
+    response = await client.post("/api/v1/books", json={**book, "available_stock": too_many})
+    assert response.status_code == 422
+    response = await client.patch(f"/api/v1/books/{book_id}", json={"available_stock": too_many})
+    assert response.status_code == 422
+
+async def test_added_copies_go_to_waiting_holds_first(client, add_book, add_reader):
+    book_id = await add_book(stock=0)
+    for _ in range(2):
+        hold = {"book_id": book_id, "reader_id": await add_reader()}
+        (await client.post("/api/v1/holds", params=hold)).raise_for_status()
+    response = await client.patch(f"/api/v1/books/{book_id}", json={"available_stock": 5})
+    assert response.json()["available_stock"] == 5 - 2
+    holds = (await client.get(f"/api/v1/books/{book_id}/holds")).json()
+    assert all(hold["allocated_at"] is not None for hold in holds)